@@ -1,27 +1,191 @@
+import time
+# Referencia para el informe de arranque: lo que tarda en importarse el módulo
+INICIO_PROGRAMA = time.perf_counter()
+
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
+from tkinter import ttk, messagebox, simpledialog, filedialog
 from enum import Enum
+from collections import Counter
+from contextlib import contextmanager
+from decimal import Decimal, ROUND_HALF_UP
+import itertools
+import asyncio
+import bisect
+import concurrent.futures
+import csv
+import heapq
+import math
+import mmap
+import multiprocessing
+import json
+import os
+import pickle
+import queue
+import random
+import re
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import tracemalloc
+import unicodedata
+import cProfile
+import functools
+
+class Histograma:
+    # Cubetas log-lineales en microsegundos: 8 subdivisiones por cada potencia de 2
+    def __init__(self):
+        self.cubetas = {}
+        self.cantidad = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+    
+    @staticmethod
+    def _indice(microsegundos):
+        valor = max(int(microsegundos), 0)
+        if valor < 8:
+            return valor
+        exponente = valor.bit_length() - 1
+        return 8 + (exponente - 3) * 8 + ((valor >> (exponente - 3)) & 7)
+    
+    @staticmethod
+    def _limite_superior(indice):
+        if indice < 8:
+            return indice + 1
+        exponente, sub = divmod(indice - 8, 8)
+        return (9 + sub) << exponente
+    
+    def registrar(self, segundos):
+        indice = self._indice(segundos * 1e6)
+        self.cubetas[indice] = self.cubetas.get(indice, 0) + 1
+        self.cantidad += 1
+        self.suma += segundos
+        if segundos > self.maximo:
+            self.maximo = segundos
+    
+    def percentil(self, p):
+        if not self.cantidad:
+            return 0.0
+        objetivo = self.cantidad * p / 100
+        acumulado = 0
+        for indice in sorted(self.cubetas):
+            acumulado += self.cubetas[indice]
+            if acumulado >= objetivo:
+                return min(self._limite_superior(indice) / 1e6, self.maximo)
+        return self.maximo
+
+class Metricas:
+    # Desactivadas por defecto: cada medición cuesta solo revisar self.activo
+    def __init__(self):
+        self.activo = False
+        self.histogramas = {}
+        self.contadores = {}
+        self._candado = threading.Lock()
+        self._perfil = None
+    
+    def registrar(self, nombre, segundos):
+        with self._candado:
+            histograma = self.histogramas.get(nombre)
+            if histograma is None:
+                histograma = self.histogramas[nombre] = Histograma()
+            histograma.registrar(segundos)
+    
+    def incrementar(self, nombre, cantidad=1):
+        if self.activo:
+            with self._candado:
+                self.contadores[nombre] = self.contadores.get(nombre, 0) + cantidad
+    
+    def medir(self, nombre):
+        def decorador(funcion):
+            @functools.wraps(funcion)
+            def envoltura(*args, **kwargs):
+                if not self.activo:
+                    return funcion(*args, **kwargs)
+                inicio = time.perf_counter()
+                try:
+                    return funcion(*args, **kwargs)
+                finally:
+                    self.registrar(nombre, time.perf_counter() - inicio)
+            return envoltura
+        return decorador
+    
+    @contextmanager
+    def cronometro(self, nombre):
+        if not self.activo:
+            yield
+            return
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(nombre, time.perf_counter() - inicio)
+    
+    def iniciar_perfil(self):
+        self._perfil = cProfile.Profile()
+        self._perfil.enable()
+    
+    def detener_perfil(self, ruta):
+        if self._perfil:
+            self._perfil.disable()
+            self._perfil.dump_stats(ruta)
+            self._perfil = None
+    
+    def exportar_prometheus(self):
+        with self._candado:
+            lineas = ["# TYPE cafeteria_latencia_segundos summary"]
+            for nombre, histograma in sorted(self.histogramas.items()):
+                for cuantil in (50, 90, 99):
+                    lineas.append(f'cafeteria_latencia_segundos{{operacion="{nombre}",quantile="{cuantil / 100}"}} '
+                                  f'{histograma.percentil(cuantil):.6f}')
+                lineas.append(f'cafeteria_latencia_segundos_sum{{operacion="{nombre}"}} {histograma.suma:.6f}')
+                lineas.append(f'cafeteria_latencia_segundos_count{{operacion="{nombre}"}} {histograma.cantidad}')
+            lineas.append("# TYPE cafeteria_eventos_total counter")
+            for nombre, valor in sorted(self.contadores.items()):
+                lineas.append(f'cafeteria_eventos_total{{evento="{nombre}"}} {valor}')
+        return "\n".join(lineas) + "\n"
+    
+    def guardar_prometheus(self, ruta):
+        # Se escribe a un temporal y se reemplaza para que el lector nunca vea un archivo a medias
+        with open(ruta + ".tmp", "w", encoding="utf-8") as archivo:
+            archivo.write(self.exportar_prometheus())
+        os.replace(ruta + ".tmp", ruta)
+
+metricas = Metricas()
 
 class Persona:
+    __slots__ = ("nombre",)
+    
     def __init__(self, nombre):
         self.nombre = nombre
 
 class Cliente(Persona):
-    def __init__(self, nombre):
+    __slots__ = ("id", "historial_pedidos")
+    _siguiente_id = itertools.count(1)
+    
+    def __init__(self, nombre, id=None):
         super().__init__(nombre)
+        # Identificador estable, usado para persistir y referenciar al cliente
+        self.id = id if id is not None else next(Cliente._siguiente_id)
         self.historial_pedidos = []
     
+    @metricas.medir("realizar_pedido")
     def realizar_pedido(self, pedido, inventario):
-        resultado = f"Pedido realizado por {self.nombre}: Pedido con {len(pedido.productos)} productos, Estado: {pedido.estado}\n"
-        if pedido.validar_pedido(inventario):
-            self.historial_pedidos.append(pedido)
-            pedido.procesar_pedido(inventario)
-            resultado += f"Pedido realizado con éxito. Total: ${pedido.calcular_total()}\n"
-            resultado += f"Estado del pedido cambiado a: {pedido.estado}"
-            return True, resultado
+        resultado = f"Pedido realizado por {self.nombre}: Pedido con {len(pedido.productos)} productos, Estado: {pedido.estado.value}\n"
+        # Verificar y descontar en un solo paso
+        if inventario.reservar(pedido.calcular_ingredientes()):
+            return True, resultado + self.confirmar_pedido(pedido)
         else:
             resultado += "No hay suficiente stock para procesar el pedido."
             return False, resultado
+    
+    def confirmar_pedido(self, pedido):
+        # Registra un pedido cuyo stock ya fue descontado; queda pendiente hasta que lo tome un barista
+        self.historial_pedidos.append(pedido)
+        pedido.fecha = time.time()
+        resultado = f"Pedido realizado con éxito. Total: {formatear_dinero(pedido.importe())}\n"
+        resultado += f"Estado del pedido: {pedido.estado.value}"
+        return resultado
 
 class RolEmpleado(Enum):
     MESERO = "Mesero"
@@ -29,125 +193,2432 @@ class RolEmpleado(Enum):
     GERENTE = "Gerente"
 
 class Empleado(Persona):
+    __slots__ = ("rol",)
+    
     def __init__(self, nombre, rol):
         super().__init__(nombre)
         self.rol = rol
 
+def a_centavos(monto):
+    # Decimal evita el error de los float: 0.1 + 0.2 son exactamente 30 centavos
+    return int((Decimal(str(monto)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def porcentaje(centavos, tasa):
+    # Redondeo comercial al centavo, mitad hacia arriba
+    return int((Decimal(centavos) * Decimal(str(tasa)) / 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def formatear_dinero(centavos):
+    signo = "-" if centavos < 0 else ""
+    return f"{signo}${abs(centavos) // 100}.{abs(centavos) % 100:02d}"
+
+def formatear_cantidad(cantidad):
+    # Las recetas usan cantidades fraccionarias: se muestran sin ceros de más
+    return f"{cantidad:.3f}".rstrip("0").rstrip(".")
+
+class Receta:
+    # Lista de materiales: ingrediente (texto) o sub-receta -> cantidad por unidad
+    __slots__ = ("nombre", "componentes", "_aplanada")
+    
+    def __init__(self, nombre, componentes):
+        self.nombre = nombre
+        self.componentes = componentes
+        self._aplanada = None
+    
+    def aplanar(self):
+        # Se calcula una sola vez; las sub-recetas compartidas reutilizan su resultado
+        if self._aplanada is None:
+            aplanada = {}
+            for componente, cantidad in self.componentes.items():
+                if isinstance(componente, Receta):
+                    for ing, cant in componente.aplanar().items():
+                        aplanada[ing] = aplanada.get(ing, 0) + cant * cantidad
+                else:
+                    aplanada[componente] = aplanada.get(componente, 0) + cantidad
+            self._aplanada = aplanada
+        return self._aplanada
+
 class ProductoBase:
-    def __init__(self, nombre, precio):
+    __slots__ = ("nombre", "precio", "receta", "ingredientes_requeridos")
+    
+    def __init__(self, nombre, precio, receta=None):
         self.nombre = nombre
         self.precio = precio
+        self.receta = receta
+        # Demanda de ingredientes por unidad, calculada una sola vez
+        self.ingredientes_requeridos = dict(receta.aplanar()) if receta else {}
 
 class Bebida(ProductoBase):
-    def __init__(self, nombre, precio, tamaño, tipo, opciones_personalizadas):
-        super().__init__(nombre, precio)
+    __slots__ = ("tamaño", "tipo", "opciones_personalizadas")
+    
+    def __init__(self, nombre, precio, tamaño, tipo, opciones_personalizadas, receta=None):
+        # La receta puede variar por tamaño: {"Mediano": Receta(...), "Grande": Receta(...)}
+        if isinstance(receta, dict):
+            receta = receta.get(tamaño)
+        super().__init__(nombre, precio, receta)
         self.tamaño = tamaño
         self.tipo = tipo
         self.opciones_personalizadas = opciones_personalizadas
+        # Sin receta, cada opción personalizada consume una unidad
+        if receta is None:
+            for opcion in opciones_personalizadas:
+                self.ingredientes_requeridos[opcion] = self.ingredientes_requeridos.get(opcion, 0) + 1
 
 class Postre(ProductoBase):
-    def __init__(self, nombre, precio, vegano, sin_gluten):
-        super().__init__(nombre, precio)
+    __slots__ = ("vegano", "sin_gluten")
+    
+    def __init__(self, nombre, precio, vegano, sin_gluten, receta=None):
+        super().__init__(nombre, precio, receta)
         self.vegano = vegano
         self.sin_gluten = sin_gluten
 
 class Inventario:
     def __init__(self):
         self.ingredientes = {}
+        # Un candado por ingrediente para que varias cajas puedan vender a la vez
+        self._candados = {}
+        self._candado_candados = threading.Lock()
+        # Funciones a llamar con los ingredientes que cambiaron
+        self.observadores = []
+        # Funciones a llamar con las cantidades descontadas
+        self.consumidores = []
+    
+    def suscribir(self, observador):
+        self.observadores.append(observador)
+    
+    def suscribir_consumo(self, consumidor):
+        self.consumidores.append(consumidor)
+    
+    def _notificar(self, ingredientes):
+        for observador in self.observadores:
+            observador(ingredientes)
+    
+    def _candado(self, ingrediente):
+        candado = self._candados.get(ingrediente)
+        if candado is None:
+            with self._candado_candados:
+                candado = self._candados.setdefault(ingrediente, threading.RLock())
+        return candado
+    
+    @contextmanager
+    def bloquear(self, ingredientes):
+        # Se adquieren siempre en orden alfabético para evitar bloqueos mutuos
+        candados = [self._candado(ing) for ing in sorted(ingredientes)]
+        for candado in candados:
+            candado.acquire()
+        try:
+            yield
+        finally:
+            for candado in reversed(candados):
+                candado.release()
+    
+    def actualizar_stock(self, ingrediente, cantidad):
+        with self.bloquear([ingrediente]):
+            self.ingredientes[ingrediente] = self.ingredientes.get(ingrediente, 0) + cantidad
+            mensaje = f"Inventario actualizado: {ingrediente} - {formatear_cantidad(self.ingredientes[ingrediente])} unidades disponibles"
+        self._notificar([ingrediente])
+        return mensaje
+    
+    def fijar_stock(self, cantidades):
+        # Reemplaza varias cantidades de una vez y avisa a los observadores una sola vez
+        with self.bloquear(cantidades):
+            self.ingredientes.update(cantidades)
+        self._notificar(list(cantidades))
+    
+    def verificar_disponibilidad(self, ingredientes_requeridos):
+        return all(self.ingredientes.get(ing, 0) >= cant for ing, cant in ingredientes_requeridos.items())
+    
+    def descontar_ingredientes(self, ingredientes_requeridos):
+        with self.bloquear(ingredientes_requeridos):
+            for ing, cant in ingredientes_requeridos.items():
+                # Se redondea para que las cantidades fraccionarias no acumulen error
+                self.ingredientes[ing] = round(self.ingredientes[ing] - cant, 6)
+        for consumidor in self.consumidores:
+            consumidor(ingredientes_requeridos)
+        self._notificar(list(ingredientes_requeridos))
+    
+    @metricas.medir("reservar")
+    def reservar(self, ingredientes_requeridos):
+        # Verifica y descuenta de forma atómica: o se descuenta todo o nada
+        with self.bloquear(ingredientes_requeridos):
+            if not self.verificar_disponibilidad(ingredientes_requeridos):
+                return False
+            self.descontar_ingredientes(ingredientes_requeridos)
+            return True
+
+class EstadoPedido(Enum):
+    PENDIENTE = "Pendiente"
+    EN_PREPARACION = "En preparación"
+    LISTO = "Listo"
+    ENTREGADO = "Entregado"
+
+TRANSICIONES_PEDIDO = {
+    EstadoPedido.PENDIENTE: EstadoPedido.EN_PREPARACION,
+    EstadoPedido.EN_PREPARACION: EstadoPedido.LISTO,
+    EstadoPedido.LISTO: EstadoPedido.ENTREGADO
+}
+
+class Pedido:
+    __slots__ = ("id", "productos", "estado", "fecha", "total", "promociones")
+    _siguiente_id = itertools.count(1)
+    
+    def __init__(self, productos, id=None):
+        # Identificador estable: con él se guardan los cambios de estado
+        self.id = id if id is not None else next(Pedido._siguiente_id)
+        # Tupla: el pedido no cambia después de creado y ocupa menos que una lista
+        self.productos = tuple(productos)
+        self.estado = EstadoPedido.PENDIENTE
+        self.fecha = None
+        # Lo cobrado en centavos y los códigos de promoción usados
+        self.total = None
+        self.promociones = ()
+    
+    def cambiar_estado(self, nuevo_estado):
+        if TRANSICIONES_PEDIDO.get(self.estado) != nuevo_estado:
+            raise ValueError(f"No se puede pasar de {self.estado.value} a {nuevo_estado.value}")
+        self.estado = nuevo_estado
+    
+    def calcular_total(self):
+        # En centavos, redondeando cada línea como el carrito: sumar los precios en float y convertir al
+        # final puede diferir en un centavo
+        return sum(a_centavos(producto.precio) * veces for producto, veces in Counter(self.productos).items())
+    
+    def importe(self):
+        # Los pedidos anteriores al cobro en centavos se valúan a precio de lista
+        return self.total if self.total is not None else self.calcular_total()
+    
+    @metricas.medir("calcular_ingredientes")
+    def calcular_ingredientes(self):
+        # Se agrupan los productos repetidos y se suma su demanda ya precalculada
+        ingredientes_necesarios = {}
+        for producto, veces in Counter(self.productos).items():
+            for ing, cant in producto.ingredientes_requeridos.items():
+                ingredientes_necesarios[ing] = ingredientes_necesarios.get(ing, 0) + cant * veces
+        return ingredientes_necesarios
+    
+    @metricas.medir("validar_pedido")
+    def validar_pedido(self, inventario):
+        return inventario.verificar_disponibilidad(self.calcular_ingredientes())
+    
+    def procesar_pedido(self, inventario):
+        inventario.descontar_ingredientes(self.calcular_ingredientes())
+        self.estado = EstadoPedido.EN_PREPARACION
+
+class PoliticaLote(Enum):
+    TODO_O_NADA = "Todo o nada"
+    PARCIAL = "Parcial"
+
+@metricas.medir("procesar_pedidos_en_lote")
+def procesar_pedidos_en_lote(pedidos, inventario, politica=PoliticaLote.PARCIAL):
+    # pedidos: lista de tuplas (cliente, pedido). Devuelve [(exito, mensaje), ...] en el mismo orden
+    requeridos_por_pedido = [pedido.calcular_ingredientes() for _, pedido in pedidos]
+    
+    # Demanda combinada de todo el lote
+    demanda_total = {}
+    for requeridos in requeridos_por_pedido:
+        for ing, cant in requeridos.items():
+            demanda_total[ing] = demanda_total.get(ing, 0) + cant
+    
+    if inventario.reservar(demanda_total):
+        # Caso rápido: hay stock para todo el lote, se descuenta una sola vez
+        aceptados = [True] * len(pedidos)
+    elif politica == PoliticaLote.TODO_O_NADA:
+        aceptados = [False] * len(pedidos)
+    else:
+        # Se atienden en orden de llegada mientras haya stock
+        with inventario.bloquear(demanda_total):
+            disponibles = {ing: inventario.ingredientes.get(ing, 0) for ing in demanda_total}
+            consumo = {}
+            aceptados = []
+            for requeridos in requeridos_por_pedido:
+                if all(disponibles[ing] >= cant for ing, cant in requeridos.items()):
+                    for ing, cant in requeridos.items():
+                        disponibles[ing] -= cant
+                        consumo[ing] = consumo.get(ing, 0) + cant
+                    aceptados.append(True)
+                else:
+                    aceptados.append(False)
+            inventario.descontar_ingredientes(consumo)
+    
+    resultados = []
+    for (cliente, pedido), aceptado in zip(pedidos, aceptados):
+        resultado = f"Pedido realizado por {cliente.nombre}: Pedido con {len(pedido.productos)} productos, Estado: {pedido.estado.value}\n"
+        if aceptado:
+            resultados.append((True, resultado + cliente.confirmar_pedido(pedido)))
+        else:
+            resultados.append((False, resultado + "No hay suficiente stock para procesar el pedido."))
+    return resultados
+
+class ColaProduccion:
+    # Cola de cocina: trabajo más corto primero, con envejecimiento para que nadie espere sin límite.
+    # La prioridad efectiva es tiempo_estimado - envejecimiento * espera; como el término con la hora
+    # actual es igual para todos, alcanza con ordenar por tiempo_estimado + envejecimiento * llegada
+    TIEMPO_BEBIDA = 90
+    TIEMPO_POSTRE = 15
+    
+    def __init__(self, baristas=(), envejecimiento=0.5, tiempos=None):
+        self.envejecimiento = envejecimiento
+        self.tiempos = tiempos or {}
+        self.pendientes = []
+        self._secuencia = itertools.count()
+        # Barista -> pedido en curso (o None) y segundos de trabajo asignados en total
+        self.en_curso = {}
+        self.carga = {}
+        # Pedido -> [cliente, llegada, tiempo estimado, inicio, barista]
+        self.info = {}
+        self.completados = 0
+        self.espera_total = 0.0
+        self.espera_maxima = 0.0
+        self.preparacion_total = 0.0
+        self.inicio = None
+        # Se llama con cada pedido que cambia de estado, para guardarlo
+        self.al_cambiar = None
+        for barista in baristas:
+            self.agregar_barista(barista)
+    
+    def tiempo_estimado(self, pedido):
+        total = 0
+        for producto in pedido.productos:
+            if producto.nombre in self.tiempos:
+                total += self.tiempos[producto.nombre]
+            elif isinstance(producto, Bebida):
+                total += self.TIEMPO_BEBIDA
+            else:
+                total += self.TIEMPO_POSTRE
+        return total
+    
+    def agregar_barista(self, barista, ahora=None):
+        self.en_curso[barista] = None
+        self.carga[barista] = 0
+        self._asignar(ahora)
+    
+    def encolar(self, cliente, pedido, ahora=None):
+        ahora = ahora if ahora is not None else time.time()
+        if self.inicio is None:
+            self.inicio = ahora
+        estimado = self.tiempo_estimado(pedido)
+        self.info[pedido] = [cliente, ahora, estimado, None, None]
+        heapq.heappush(self.pendientes, (estimado + self.envejecimiento * ahora, next(self._secuencia), pedido))
+        self._asignar(ahora)
+        return self.info[pedido][4]
+    
+    def restaurar(self, cliente, pedido, ahora=None):
+        # Pedidos sin entregar de una sesión anterior. Los que estaban en preparación vuelven primero a la cola
+        # (el barista que los tenía puede no estar); los listos solo esperan la entrega
+        if pedido.estado == EstadoPedido.PENDIENTE:
+            return self.encolar(cliente, pedido, ahora)
+        ahora = ahora if ahora is not None else time.time()
+        if self.inicio is None:
+            self.inicio = ahora
+        estimado = self.tiempo_estimado(pedido)
+        if pedido.estado == EstadoPedido.LISTO:
+            self.info[pedido] = [cliente, ahora, estimado, ahora, None]
+            return None
+        self.info[pedido] = [cliente, ahora, estimado, None, None]
+        heapq.heappush(self.pendientes, (-math.inf, next(self._secuencia), pedido))
+        self._asignar(ahora)
+        return self.info[pedido][4]
+    
+    def _cambiar_estado(self, pedido, estado):
+        pedido.cambiar_estado(estado)
+        if self.al_cambiar:
+            self.al_cambiar(pedido)
+    
+    def _asignar(self, ahora=None):
+        ahora = ahora if ahora is not None else time.time()
+        libres = [barista for barista, pedido in self.en_curso.items() if pedido is None]
+        while libres and self.pendientes:
+            # Entre los baristas libres se elige el de menor carga acumulada
+            barista = min(libres, key=lambda b: self.carga[b])
+            libres.remove(barista)
+            _, _, pedido = heapq.heappop(self.pendientes)
+            info = self.info[pedido]
+            info[3] = ahora
+            info[4] = barista
+            self.en_curso[barista] = pedido
+            self.carga[barista] += info[2]
+            if pedido.estado == EstadoPedido.PENDIENTE:
+                self._cambiar_estado(pedido, EstadoPedido.EN_PREPARACION)
+            espera = ahora - info[1]
+            self.espera_total += espera
+            self.espera_maxima = max(self.espera_maxima, espera)
+    
+    def marcar_listo(self, pedido, ahora=None):
+        ahora = ahora if ahora is not None else time.time()
+        info = self.info[pedido]
+        if info[4] is None:
+            raise ValueError("El pedido todavía no tiene un barista asignado")
+        self._cambiar_estado(pedido, EstadoPedido.LISTO)
+        self.en_curso[info[4]] = None
+        self.preparacion_total += ahora - info[3]
+        self._asignar(ahora)
+    
+    def entregar(self, pedido):
+        self._cambiar_estado(pedido, EstadoPedido.ENTREGADO)
+        del self.info[pedido]
+        self.completados += 1
+    
+    def activos(self):
+        # (cliente, pedido, barista) de lo que aún no se entregó, en orden de llegada
+        return [(info[0], pedido, info[4]) for pedido, info in sorted(self.info.items(), key=lambda item: item[1][1])]
+    
+    def resumen(self, ahora=None):
+        ahora = ahora if ahora is not None else time.time()
+        iniciados = self.completados + sum(1 for info in self.info.values() if info[3] is not None)
+        horas = (ahora - self.inicio) / 3600 if self.inicio is not None else 0
+        return {
+            "pendientes": len(self.pendientes),
+            "en_preparacion": sum(1 for pedido in self.en_curso.values() if pedido is not None),
+            "entregados": self.completados,
+            "pedidos_por_hora": self.completados / horas if horas else 0,
+            "espera_promedio": self.espera_total / iniciados if iniciados else 0,
+            "espera_maxima": self.espera_maxima
+        }
+
+def simular_turno(baristas, pedidos_por_hora, horas=8, productos=None, semilla=0):
+    # Simulación de eventos discretos: llegadas de Poisson y preparación con el tiempo estimado ±20%
+    aleatorio = random.Random(semilla)
+    productos = productos or [Bebida("Café", 30, "Mediano", "Caliente", []), Postre("Galleta", 20, False, False)]
+    cola = ColaProduccion([Empleado(f"Barista {i + 1}", RolEmpleado.BARISTA) for i in range(baristas)])
+    cliente = Cliente("Simulación", id=0)
+    fin = horas * 3600
+    
+    eventos = []
+    llegada = aleatorio.expovariate(pedidos_por_hora / 3600)
+    while llegada < fin:
+        pedido = Pedido(aleatorio.choices(productos, k=aleatorio.randint(1, 3)))
+        heapq.heappush(eventos, (llegada, 0, id(pedido), pedido))
+        llegada += aleatorio.expovariate(pedidos_por_hora / 3600)
+    
+    momento = 0
+    programados = set()
+    while eventos:
+        momento, tipo, _, pedido = heapq.heappop(eventos)
+        if tipo == 0:
+            cola.encolar(cliente, pedido, momento)
+        else:
+            programados.discard(pedido)
+            cola.marcar_listo(pedido, momento)
+            cola.entregar(pedido)
+        # Cada pedido que empezó a prepararse agenda su fin
+        for en_curso in cola.en_curso.values():
+            if en_curso is not None and en_curso not in programados:
+                programados.add(en_curso)
+                duracion = cola.info[en_curso][2] * aleatorio.uniform(0.8, 1.2)
+                heapq.heappush(eventos, (momento + duracion, 1, id(en_curso), en_curso))
+    return cola.resumen(max(fin, momento))
+
+class ResultadoPromocion(Enum):
+    APLICADA = "aplicada"
+    YA_APLICADA = "ya_aplicada"
+    NO_ELEGIBLE = "no_elegible"
+    INVALIDA = "invalida"
+
+class Promocion:
+    __slots__ = ("codigo", "descuento", "clientes_frecuentes", "_ids_frecuentes", "version")
+    
+    def __init__(self, codigo, descuento, clientes_frecuentes):
+        self.codigo = codigo
+        self.descuento = descuento
+        self.clientes_frecuentes = clientes_frecuentes
+        # Conjunto de ids para verificar la elegibilidad en O(1)
+        self._ids_frecuentes = {cliente.id for cliente in clientes_frecuentes}
+        # Cambia con el descuento o los clientes: los carritos la usan para saber si su total sigue valiendo
+        self.version = 0
+    
+    def cambiar_descuento(self, descuento):
+        if descuento != self.descuento:
+            self.descuento = descuento
+            self.version += 1
+    
+    def agregar_cliente_frecuente(self, cliente):
+        if cliente.id not in self._ids_frecuentes:
+            self.clientes_frecuentes.append(cliente)
+            self._ids_frecuentes.add(cliente.id)
+            self.version += 1
+    
+    def es_elegible(self, cliente):
+        return cliente.id in self._ids_frecuentes
+    
+    @metricas.medir("aplicar_descuento")
+    def aplicar_descuento(self, cliente, total):
+        # total en centavos
+        if self.es_elegible(cliente):
+            return total - porcentaje(total, self.descuento)
+        return total
+
+class IndicePromociones:
+    def __init__(self, promociones=()):
+        self.por_codigo = {}
+        # id de cliente -> promociones en las que participa
+        self.por_cliente = {}
+        for promocion in promociones:
+            self.agregar(promocion)
+    
+    def agregar(self, promocion):
+        # Si hay códigos repetidos se conserva el primero, como en la búsqueda lineal
+        if promocion.codigo in self.por_codigo:
+            return False
+        self.por_codigo[promocion.codigo] = promocion
+        for cliente in promocion.clientes_frecuentes:
+            self.por_cliente.setdefault(cliente.id, []).append(promocion)
+        return True
+    
+    def agregar_cliente_frecuente(self, promocion, cliente):
+        if not promocion.es_elegible(cliente):
+            promocion.agregar_cliente_frecuente(cliente)
+            self.por_cliente.setdefault(cliente.id, []).append(promocion)
+    
+    def buscar(self, codigo):
+        return self.por_codigo.get(codigo)
+    
+    def evaluar(self, cliente, total):
+        # Todas las promociones aplicables al carrito, de mayor a menor descuento
+        resultados = [(promocion, promocion.aplicar_descuento(cliente, total))
+                      for promocion in self.por_cliente.get(cliente.id, [])]
+        resultados.sort(key=lambda resultado: resultado[1])
+        return resultados
+
+def normalizar(texto):
+    # Minúsculas y sin acentos: "Arándanos" -> "arandanos"
+    descompuesto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(caracter for caracter in descompuesto if not unicodedata.combining(caracter))
+
+class IndiceCatalogo:
+    # Búsqueda por prefijo de cualquier palabra del nombre, con filtros como máscaras de bits
+    def __init__(self, productos=()):
+        self.productos = []
+        self.claves = []
+        self.posiciones = []
+        self.veganos = 0
+        self.sin_gluten = 0
+        self.por_tipo = {}
+        self.por_tamaño = {}
+        
+        # Carga inicial: se ordenan todas las claves una sola vez
+        entradas = []
+        for producto in productos:
+            indice = self._registrar(producto)
+            entradas.extend((clave, indice) for clave in self._claves_de(producto))
+        entradas.sort()
+        self.claves = [clave for clave, _ in entradas]
+        self.posiciones = [indice for _, indice in entradas]
+    
+    @staticmethod
+    def _claves_de(producto):
+        # Una clave por cada palabra, para que "arandanos" encuentre "Muffin de Arándanos"
+        palabras = normalizar(producto.nombre).split()
+        return [" ".join(palabras[i:]) for i in range(len(palabras))]
+    
+    def agregar(self, producto):
+        indice = self._registrar(producto)
+        for clave in self._claves_de(producto):
+            posicion = bisect.bisect_right(self.claves, clave)
+            self.claves.insert(posicion, clave)
+            self.posiciones.insert(posicion, indice)
+        return indice
+    
+    def agregar_lote(self, productos):
+        # Muchos productos juntos: se vuelven a ordenar las claves una vez en lugar de insertar de a una
+        entradas = list(zip(self.claves, self.posiciones))
+        for producto in productos:
+            indice = self._registrar(producto)
+            entradas.extend((clave, indice) for clave in self._claves_de(producto))
+        entradas.sort()
+        self.claves = [clave for clave, _ in entradas]
+        self.posiciones = [indice for _, indice in entradas]
+    
+    def _registrar(self, producto):
+        indice = len(self.productos)
+        self.productos.append(producto)
+        bit = 1 << indice
+        
+        if isinstance(producto, Postre):
+            if producto.vegano:
+                self.veganos |= bit
+            if producto.sin_gluten:
+                self.sin_gluten |= bit
+        elif isinstance(producto, Bebida):
+            self.por_tipo[producto.tipo] = self.por_tipo.get(producto.tipo, 0) | bit
+            self.por_tamaño[producto.tamaño] = self.por_tamaño.get(producto.tamaño, 0) | bit
+        return indice
+    
+    def _mascara(self, vegano, sin_gluten, tipo, tamaño):
+        mascara = (1 << len(self.productos)) - 1
+        if vegano:
+            mascara &= self.veganos
+        if sin_gluten:
+            mascara &= self.sin_gluten
+        if tipo is not None:
+            mascara &= self.por_tipo.get(tipo, 0)
+        if tamaño is not None:
+            mascara &= self.por_tamaño.get(tamaño, 0)
+        return mascara
+    
+    def buscar(self, texto="", vegano=False, sin_gluten=False, tipo=None, tamaño=None, limite=200):
+        # Devuelve índices de productos en orden de catálogo (sin texto) o alfabético (con texto)
+        filtrado = vegano or sin_gluten or tipo is not None or tamaño is not None
+        # La máscara se pasa a bytes para consultar cada bit en O(1)
+        bits = self._mascara(vegano, sin_gluten, tipo, tamaño).to_bytes(len(self.productos) // 8 + 1, "little")
+        resultados = []
+        prefijo = normalizar(texto.strip())
+        if not prefijo:
+            if not filtrado:
+                return list(range(min(limite, len(self.productos))))
+            # Se saltan los bytes en cero con una búsqueda en C
+            for coincidencia in re.finditer(rb"[^\x00]", bits):
+                byte = coincidencia.start()
+                for bit in range(8):
+                    if bits[byte] >> bit & 1:
+                        resultados.append(byte * 8 + bit)
+                if len(resultados) >= limite:
+                    return resultados[:limite]
+            return resultados
+        
+        # Todas las claves que empiezan con el prefijo forman un rango contiguo
+        inicio = bisect.bisect_left(self.claves, prefijo)
+        fin = bisect.bisect_left(self.claves, prefijo + "\U0010ffff", inicio)
+        vistos = set()
+        posiciones = self.posiciones
+        for posicion in range(inicio, fin):
+            indice = posiciones[posicion]
+            if indice not in vistos and (not filtrado or bits[indice >> 3] >> (indice & 7) & 1):
+                vistos.add(indice)
+                resultados.append(indice)
+                if len(resultados) >= limite:
+                    break
+        return resultados
+
+class Ranking:
+    # Las claves con los valores más altos de un contador que solo crece. Como ningún valor baja, una clave
+    # fuera del ranking nunca supera al mínimo sin entrar en él: basta mirar la clave que cambió
+    __slots__ = ("capacidad", "valores", "minimo")
+    
+    def __init__(self, capacidad=10):
+        self.capacidad = capacidad
+        self.valores = {}
+        self.minimo = None
+    
+    @classmethod
+    def desde(cls, contador, capacidad=10):
+        ranking = cls(capacidad)
+        for clave, valor in heapq.nlargest(capacidad, contador.items(), key=lambda item: item[1]):
+            ranking.actualizar(clave, valor)
+        return ranking
+    
+    def actualizar(self, clave, valor):
+        valores = self.valores
+        if clave in valores:
+            valores[clave] = valor
+            if clave == self.minimo:
+                self.minimo = min(valores, key=valores.get)
+        elif len(valores) < self.capacidad:
+            valores[clave] = valor
+            if self.minimo is None or valor < valores[self.minimo]:
+                self.minimo = clave
+        elif valor > valores[self.minimo]:
+            del valores[self.minimo]
+            valores[clave] = valor
+            self.minimo = min(valores, key=valores.get)
+    
+    def mayores(self, cantidad):
+        return sorted(self.valores.items(), key=lambda item: item[1], reverse=True)[:cantidad]
+
+class Estadisticas:
+    # Agregados que se actualizan con cada pedido confirmado, para consultas en O(1)
+    def __init__(self):
+        self.total_pedidos = 0
+        # Ingresos en centavos: lo cobrado en cada pedido; por producto, a precio de lista
+        self.ingresos_totales = 0
+        self.ingresos_por_producto = {}
+        self.unidades_por_producto = {}
+        self.ingresos_por_cliente = {}
+        self.pedidos_por_cliente = {}
+        self.ingresos_por_hora = [0] * 24
+        self.consumo_ingredientes = {}
+        self.primera_fecha = None
+        self.ultima_fecha = None
+        # Los más vendidos y los mejores clientes se mantienen al registrar; no se exportan
+        self._ranking_productos = Ranking()
+        self._ranking_clientes = Ranking()
+    
+    def registrar(self, cliente, pedido, ingredientes=None):
+        for producto in pedido.productos:
+            self.ingresos_por_producto[producto.nombre] = (self.ingresos_por_producto.get(producto.nombre, 0)
+                                                           + a_centavos(producto.precio))
+            unidades = self.unidades_por_producto.get(producto.nombre, 0) + 1
+            self.unidades_por_producto[producto.nombre] = unidades
+            self._ranking_productos.actualizar(producto.nombre, unidades)
+        total = pedido.importe()
+        
+        self.total_pedidos += 1
+        self.ingresos_totales += total
+        ingresos = self.ingresos_por_cliente.get(cliente.id, 0) + total
+        self.ingresos_por_cliente[cliente.id] = ingresos
+        self._ranking_clientes.actualizar(cliente.id, ingresos)
+        self.pedidos_por_cliente[cliente.id] = self.pedidos_por_cliente.get(cliente.id, 0) + 1
+        
+        if ingredientes is None:
+            ingredientes = pedido.calcular_ingredientes()
+        for ing, cant in ingredientes.items():
+            self.consumo_ingredientes[ing] = self.consumo_ingredientes.get(ing, 0) + cant
+        
+        if pedido.fecha is not None:
+            self.ingresos_por_hora[time.localtime(pedido.fecha).tm_hour] += total
+            if self.primera_fecha is None or pedido.fecha < self.primera_fecha:
+                self.primera_fecha = pedido.fecha
+            if self.ultima_fecha is None or pedido.fecha > self.ultima_fecha:
+                self.ultima_fecha = pedido.fecha
+    
+    def exportar(self):
+        datos = {clave: valor for clave, valor in self.__dict__.items() if not clave.startswith("_")}
+        return dict(datos, unidad="centavos")
+    
+    def importar(self, datos):
+        # Los agregados guardados antes sumaban precios de lista en pesos: se devuelve False para recalcularlos
+        datos = dict(datos)
+        if datos.pop("unidad", None) != "centavos":
+            return False
+        self.__dict__.update(datos)
+        # JSON convierte las claves numéricas en texto
+        self.ingresos_por_cliente = {int(k): v for k, v in self.ingresos_por_cliente.items()}
+        self.pedidos_por_cliente = {int(k): v for k, v in self.pedidos_por_cliente.items()}
+        self._ranking_productos = Ranking.desde(self.unidades_por_producto)
+        self._ranking_clientes = Ranking.desde(self.ingresos_por_cliente)
+        return True
+    
+    def productos_mas_vendidos(self, cantidad=5):
+        if cantidad <= self._ranking_productos.capacidad:
+            return self._ranking_productos.mayores(cantidad)
+        return heapq.nlargest(cantidad, self.unidades_por_producto.items(), key=lambda item: item[1])
+    
+    def mejores_clientes(self, cantidad=5):
+        if cantidad <= self._ranking_clientes.capacidad:
+            return self._ranking_clientes.mayores(cantidad)
+        return heapq.nlargest(cantidad, self.ingresos_por_cliente.items(), key=lambda item: item[1])
+    
+    def tasa_consumo(self, ingrediente):
+        # Unidades por hora entre el primer y el último pedido registrado
+        if self.primera_fecha is None or self.ultima_fecha == self.primera_fecha:
+            return 0
+        horas = (self.ultima_fecha - self.primera_fecha) / 3600
+        return self.consumo_ingredientes.get(ingrediente, 0) / horas
+
+class PronosticoStock:
+    # Tasas de consumo por ingrediente y hora del día (promedio móvil exponencial, unidades por hora)
+    def __init__(self, inventario, alfa=0.3, horas_anticipacion=24, margen=0.2, al_alertar=None):
+        self.inventario = inventario
+        self.alfa = alfa
+        self.horas_anticipacion = horas_anticipacion
+        self.margen = margen
+        self.al_alertar = al_alertar
+        self.tasas = {}
+        self.puntos_reorden = {}
+        self.alertados = set()
+        # Hora en curso y lo consumido en ella, antes de incorporarlo a la tasa
+        self._hora_actual = {}
+        self._acumulado = {}
+        inventario.suscribir_consumo(self.registrar)
+        inventario.suscribir(self.revisar_stock)
+    
+    @staticmethod
+    def _hora_del_dia(hora_absoluta):
+        return time.localtime(hora_absoluta * 3600).tm_hour
+    
+    def registrar(self, ingredientes, momento=None):
+        hora = int((momento if momento is not None else time.time()) // 3600)
+        for ing, cant in ingredientes.items():
+            hora_actual = self._hora_actual.get(ing)
+            if hora_actual is None:
+                self.tasas[ing] = [0.0] * 24
+                self._hora_actual[ing] = hora
+                self._acumulado[ing] = 0
+            elif hora > hora_actual:
+                self._cerrar_horas(ing, hora)
+            self._acumulado[ing] += cant
+    
+    def _cerrar_horas(self, ing, hora):
+        # Incorpora la hora terminada y las horas sin consumo (como mucho un día completo)
+        tasas = self.tasas[ing]
+        hora_actual = self._hora_actual[ing]
+        consumo = self._acumulado[ing]
+        for h in range(hora_actual, min(hora, hora_actual + 24)):
+            del_dia = self._hora_del_dia(h)
+            tasas[del_dia] = self.alfa * consumo + (1 - self.alfa) * tasas[del_dia]
+            consumo = 0
+        self._hora_actual[ing] = hora
+        self._acumulado[ing] = 0
+        self.puntos_reorden[ing] = self.demanda_prevista(ing, self.horas_anticipacion) * (1 + self.margen)
+    
+    def exportar(self):
+        return {"tasas": self.tasas, "puntos_reorden": self.puntos_reorden,
+                "hora_actual": self._hora_actual, "acumulado": self._acumulado}
+    
+    def importar(self, datos):
+        self.tasas = datos["tasas"]
+        self.puntos_reorden = datos["puntos_reorden"]
+        self._hora_actual = datos["hora_actual"]
+        self._acumulado = datos["acumulado"]
+    
+    def revisar_stock(self, ingredientes):
+        for ing in ingredientes:
+            stock = self.inventario.ingredientes.get(ing, 0)
+            punto = self.puntos_reorden.get(ing, 0)
+            if stock > punto:
+                self.alertados.discard(ing)
+            elif punto and ing not in self.alertados:
+                self.alertados.add(ing)
+                if self.al_alertar:
+                    self.al_alertar(ing, stock, punto)
+    
+    def demanda_prevista(self, ing, horas, desde=None):
+        tasas = self.tasas.get(ing)
+        if tasas is None:
+            return 0
+        hora = int((desde if desde is not None else time.time()) // 3600)
+        return sum(tasas[self._hora_del_dia(h)] for h in range(hora, hora + horas))
+    
+    def horas_hasta_agotarse(self, ing, desde=None, maximo=24 * 7):
+        tasas = self.tasas.get(ing)
+        restante = self.inventario.ingredientes.get(ing, 0)
+        if tasas is None or not any(tasas):
+            return None
+        hora = int((desde if desde is not None else time.time()) // 3600)
+        for horas in range(maximo):
+            restante -= tasas[self._hora_del_dia(hora + horas)]
+            if restante < 0:
+                return horas
+        return None
+    
+    def sugerencias_reorden(self, desde=None):
+        # (ingrediente, stock, horas hasta agotarse, cantidad sugerida), más urgentes primero
+        sugerencias = []
+        for ing in self.tasas:
+            stock = self.inventario.ingredientes.get(ing, 0)
+            objetivo = self.demanda_prevista(ing, self.horas_anticipacion, desde) * (1 + self.margen)
+            if stock < objetivo:
+                sugerencias.append((ing, stock, self.horas_hasta_agotarse(ing, desde), math.ceil(objetivo - stock)))
+        sugerencias.sort(key=lambda sugerencia: sugerencia[2] if sugerencia[2] is not None else float("inf"))
+        return sugerencias
+
+def iterar_historial(cliente, inicio=0, fin=None):
+    # Genera las líneas del historial sin armar un único texto gigante
+    for i, pedido in enumerate(itertools.islice(cliente.historial_pedidos, inicio, fin), start=inicio):
+        yield f"Pedido {i+1}: {formatear_dinero(pedido.importe())} - Estado: {pedido.estado.value}"
+        for producto in pedido.productos:
+            yield f"  - {producto.nombre}"
+
+def leer_filas(ruta):
+    # Genera (línea, fila) sin cargar el archivo entero: CSV con encabezado o un objeto JSON por línea.
+    # Una línea JSON mal formada se entrega como None para reportarla sin cortar la importación
+    # utf-8-sig: Excel guarda los CSV con una marca BOM que, si no, quedaría pegada al primer encabezado
+    with open(ruta, encoding="utf-8-sig", newline="") as archivo:
+        if ruta.lower().endswith(".csv"):
+            lector = csv.DictReader(archivo)
+            for fila in lector:
+                yield lector.line_num, fila
+        else:
+            for numero, linea in enumerate(archivo, start=1):
+                if linea.strip():
+                    try:
+                        yield numero, json.loads(linea)
+                    except ValueError:
+                        yield numero, None
+
+def escribir_filas(ruta, columnas, filas):
+    # filas puede ser un generador: se escribe a medida que se produce
+    cantidad = 0
+    with open(ruta, "w", encoding="utf-8", newline="") as archivo:
+        if ruta.lower().endswith(".csv"):
+            escritor = csv.writer(archivo)
+            escritor.writerow(columnas)
+            for fila in filas:
+                escritor.writerow([_celda_csv(fila.get(columna)) for columna in columnas])
+                cantidad += 1
+        else:
+            for fila in filas:
+                archivo.write(json.dumps(fila, ensure_ascii=False) + "\n")
+                cantidad += 1
+    return cantidad
+
+def _celda_csv(valor):
+    # Listas como "a|b" y diccionarios como "a=1|b=2"
+    if valor is None:
+        return ""
+    if isinstance(valor, bool):
+        return int(valor)
+    if isinstance(valor, list):
+        return "|".join(valor)
+    if isinstance(valor, dict):
+        return "|".join(f"{clave}={cantidad}" for clave, cantidad in valor.items())
+    return valor
+
+def _vacio(valor):
+    return valor is None or (isinstance(valor, str) and not valor.strip())
+
+def _texto(fila, campo):
+    valor = fila.get(campo)
+    if _vacio(valor):
+        raise ValueError(f"Falta el campo '{campo}'")
+    return str(valor).strip()
+
+def _numero(fila, campo, opcional=False):
+    valor = fila.get(campo)
+    if _vacio(valor):
+        if opcional:
+            return None
+        raise ValueError(f"Falta el campo '{campo}'")
+    if isinstance(valor, bool):
+        raise ValueError(f"'{campo}' no es un número: {valor}")
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{campo}' no es un número: {valor}")
+    if not math.isfinite(numero) or numero < 0:
+        raise ValueError(f"'{campo}' debe ser un número positivo: {valor}")
+    return int(numero) if numero.is_integer() else numero
+
+def _entero(fila, campo, opcional=False):
+    # Ids: "3" y "3.0" valen, "2.5" no
+    numero = _numero(fila, campo, opcional)
+    if numero is not None and not isinstance(numero, int):
+        raise ValueError(f"'{campo}' debe ser un entero: {fila.get(campo)}")
+    return numero
+
+def _indice_valido(valor, cantidad):
+    # Posición en una lista recibida desde afuera: sin negativos ni booleanos, que Python aceptaría
+    return type(valor) is int and 0 <= valor < cantidad
+
+def _booleano(valor):
+    return str(valor).strip().lower() in ("1", "true", "sí", "si", "s", "x")
+
+def _lista(valor):
+    if _vacio(valor):
+        return []
+    if isinstance(valor, list):
+        return [str(elemento) for elemento in valor]
+    return [elemento.strip() for elemento in str(valor).split("|") if elemento.strip()]
+
+def _ingredientes(valor):
+    if _vacio(valor):
+        return None
+    if not isinstance(valor, dict):
+        pares = [par.split("=", 1) for par in str(valor).split("|") if par.strip()]
+        if any(len(par) != 2 for par in pares):
+            raise ValueError(f"Ingredientes mal formados: {valor}")
+        valor = {nombre.strip(): cantidad for nombre, cantidad in pares}
+    return {nombre: _numero(valor, nombre) for nombre in valor}
+
+def validar_cliente(fila):
+    return _entero(fila, "id", opcional=True), _texto(fila, "nombre")
+
+def validar_producto(fila):
+    clase = _texto(fila, "clase")
+    nombre = _texto(fila, "nombre")
+    precio = _numero(fila, "precio")
+    if clase == "Bebida":
+        producto = Bebida(nombre, precio, _texto(fila, "tamaño"), _texto(fila, "tipo"), _lista(fila.get("opciones")))
+    elif clase == "Postre":
+        producto = Postre(nombre, precio, _booleano(fila.get("vegano")), _booleano(fila.get("sin_gluten")))
+    else:
+        raise ValueError(f"Clase de producto desconocida: {clase}")
+    ingredientes = _ingredientes(fila.get("ingredientes"))
+    if ingredientes is not None:
+        producto.ingredientes_requeridos = ingredientes
+    return producto, ingredientes is not None
+
+def validar_stock(fila):
+    return _texto(fila, "ingrediente"), _numero(fila, "cantidad")
+
+def validar_promocion(fila):
+    descuento = _numero(fila, "descuento", opcional=True)
+    if descuento is not None and (not isinstance(descuento, int) or not 0 < descuento <= 100):
+        raise ValueError(f"El descuento debe ser un entero entre 1 y 100: {descuento}")
+    return _texto(fila, "codigo"), descuento, _entero(fila, "cliente_id", opcional=True)
+
+COLUMNAS_EXPORTACION = {
+    "clientes": ["id", "nombre"],
+    "productos": ["clase", "nombre", "precio", "tamaño", "tipo", "opciones", "vegano", "sin_gluten", "ingredientes"],
+    "inventario": ["ingrediente", "cantidad"],
+    "promociones": ["codigo", "descuento", "cliente_id"]
+}
+
+class Repositorio:
+    # Repositorio en memoria: no persiste nada. Sirve de interfaz para otros backends
+    def cargar(self):
+        return None
+    
+    def guardar_todo(self, clientes, productos, empleados, promociones, inventario):
+        pass
+    
+    def guardar_cliente(self, cliente):
+        pass
+    
+    def guardar_empleado(self, empleado):
+        pass
+    
+    def guardar_promocion(self, promocion):
+        pass
+    
+    def guardar_stock(self, inventario, ingredientes):
+        pass
+    
+    def guardar_pedido(self, cliente, pedido, inventario):
+        pass
+    
+    def guardar_pedidos(self, pedidos, inventario):
+        # Pedidos procesados en lote: lista de (cliente, pedido), en una sola escritura
+        pass
+    
+    def guardar_estado_pedido(self, pedido):
+        pass
+    
+    def guardar_lote(self, clientes=(), productos=(), promociones=(), inventario=None, ingredientes=()):
+        # Importaciones: todo en una sola escritura. promociones es una lista de (promocion, clientes nuevos)
+        pass
+    
+    def guardar_estado(self, servicio):
+        # Se llama al cerrar el servicio, con todo el estado en memoria
+        pass
+    
+    def suscribir_fallos(self, observador):
+        # Escrituras diferidas que no se pudieron guardar: el observador recibe (error, operaciones)
+        pass
+    
+    def cerrar(self):
+        pass
+
+class RepositorioSQLite(Repositorio):
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS clientes (id INTEGER PRIMARY KEY, nombre TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS empleados (id INTEGER PRIMARY KEY AUTOINCREMENT, nombre TEXT NOT NULL, rol TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS productos (
+            nombre TEXT PRIMARY KEY, clase TEXT NOT NULL, precio INTEGER NOT NULL,
+            tamaño TEXT, tipo TEXT, opciones TEXT, vegano INTEGER, sin_gluten INTEGER, ingredientes TEXT);
+        CREATE TABLE IF NOT EXISTS inventario (ingrediente TEXT PRIMARY KEY, cantidad INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS promociones (codigo TEXT PRIMARY KEY, descuento INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS promocion_clientes (
+            codigo TEXT NOT NULL, cliente_id INTEGER NOT NULL, PRIMARY KEY (codigo, cliente_id));
+        CREATE TABLE IF NOT EXISTS pedidos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, cliente_id INTEGER NOT NULL,
+            estado TEXT NOT NULL, productos TEXT NOT NULL, fecha REAL, total INTEGER, promociones TEXT);
+    """
+    
+    def __init__(self, ruta, escritura_diferida=True, tamaño_lote=200):
+        self.ruta = ruta
+        self.escritura_diferida = escritura_diferida
+        self.tamaño_lote = tamaño_lote
+        self.conexion = self._conectar()
+        self.conexion.executescript(self.ESQUEMA)
+        # Columnas agregadas después de la primera versión de la base
+        for tabla, columna, tipo in (("pedidos", "fecha", "REAL"), ("productos", "ingredientes", "TEXT"),
+                                     ("pedidos", "total", "INTEGER"), ("pedidos", "promociones", "TEXT")):
+            columnas = [fila[1] for fila in self.conexion.execute(f"PRAGMA table_info({tabla})")]
+            if columna not in columnas:
+                self.conexion.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {tipo}")
+        
+        # Cola de escritura: un hilo agrupa las operaciones pendientes en transacciones
+        self._cola = queue.Queue()
+        self.observadores_fallos = []
+        self._fallos = []
+        # Transacciones confirmadas, para comparar la escritura diferida con la directa
+        self.transacciones = 0
+        self._candado_fallos = threading.Lock()
+        self._hilo = None
+        if escritura_diferida:
+            self._hilo = threading.Thread(target=self._escritor, daemon=True)
+            self._hilo.start()
+    
+    def _conectar(self, **opciones):
+        conexion = sqlite3.connect(self.ruta, check_same_thread=False, **opciones)
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.execute("PRAGMA synchronous=NORMAL")
+        return conexion
+    
+    def _escribir(self, operaciones):
+        if self.escritura_diferida:
+            self._cola.put(operaciones)
+        else:
+            with self.conexion:
+                for sql, parametros in operaciones:
+                    self.conexion.execute(sql, parametros)
+            self.transacciones += 1
+    
+    def _escritor(self):
+        # Sin aislamiento automático: la transacción y los puntos de guardado se abren a mano
+        conexion = self._conectar(isolation_level=None)
+        terminar = False
+        while not terminar:
+            lote = [self._cola.get()]
+            # Se toma todo lo que ya esté encolado, hasta el tamaño del lote
+            while len(lote) < self.tamaño_lote:
+                try:
+                    lote.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            # El aviso de cierre se mira fuera de la transacción: el hilo termina aunque el lote falle
+            terminar = any(operaciones is None for operaciones in lote)
+            grupos = [operaciones for operaciones in lote if operaciones is not None]
+            try:
+                conexion.execute("BEGIN")
+                for operaciones in grupos:
+                    # Cada grupo encolado (un pedido con su stock, una importación) tiene su punto de guardado:
+                    # si falla se deshace solo ese grupo y el resto del lote se confirma
+                    conexion.execute("SAVEPOINT grupo")
+                    try:
+                        for sql, parametros in operaciones:
+                            conexion.execute(sql, parametros)
+                    except sqlite3.Error as error:
+                        conexion.execute("ROLLBACK TO grupo")
+                        self._informar_fallo(error, operaciones)
+                    conexion.execute("RELEASE grupo")
+                conexion.execute("COMMIT")
+                self.transacciones += 1
+            except sqlite3.Error as error:
+                # No se pudo confirmar (disco lleno, base bloqueada): se pierde el lote entero
+                if conexion.in_transaction:
+                    conexion.rollback()
+                self._informar_fallo(error, [operacion for operaciones in grupos for operacion in operaciones])
+            finally:
+                for _ in lote:
+                    self._cola.task_done()
+        conexion.close()
+    
+    def suscribir_fallos(self, observador):
+        self.observadores_fallos.append(observador)
+    
+    def _informar_fallo(self, error, operaciones):
+        with self._candado_fallos:
+            self._fallos.append(error)
+        if not self.observadores_fallos:
+            print(f"Error al guardar en la base de datos ({len(operaciones)} operaciones perdidas): {error}",
+                  file=sys.stderr)
+        for observador in self.observadores_fallos:
+            observador(error, operaciones)
+    
+    def esperar_escrituras(self):
+        # Espera a que se guarde todo lo encolado; si algo falló desde la última espera, lo informa
+        if self._hilo:
+            self._cola.join()
+        with self._candado_fallos:
+            fallos, self._fallos = self._fallos, []
+        if fallos:
+            raise sqlite3.Error(f"{len(fallos)} escrituras no se pudieron guardar; la última: {fallos[-1]}")
+    
+    def cargar(self):
+        if self.conexion.execute("SELECT COUNT(*) FROM productos").fetchone()[0] == 0:
+            return None
+        
+        productos = []
+        for nombre, clase, precio, tamaño, tipo, opciones, vegano, sin_gluten, ingredientes in self.conexion.execute(
+                "SELECT nombre, clase, precio, tamaño, tipo, opciones, vegano, sin_gluten, ingredientes "
+                "FROM productos ORDER BY rowid"):
+            if clase == "Bebida":
+                producto = Bebida(nombre, precio, tamaño, tipo, json.loads(opciones))
+            else:
+                producto = Postre(nombre, precio, bool(vegano), bool(sin_gluten))
+            # Se guarda la receta ya aplanada, que es lo que determina el consumo
+            if ingredientes is not None:
+                producto.ingredientes_requeridos = json.loads(ingredientes)
+            productos.append(producto)
+        productos_por_nombre = {producto.nombre: producto for producto in productos}
+        
+        clientes = [Cliente(nombre, id) for id, nombre in
+                    self.conexion.execute("SELECT id, nombre FROM clientes ORDER BY id")]
+        clientes_por_id = {cliente.id: cliente for cliente in clientes}
+        if clientes:
+            Cliente._siguiente_id = itertools.count(clientes[-1].id + 1)
+        
+        ultimo_pedido = 0
+        for id, cliente_id, estado, nombres, fecha, total, codigos in self.conexion.execute(
+                "SELECT id, cliente_id, estado, productos, fecha, total, promociones FROM pedidos ORDER BY id"):
+            pedido = Pedido([productos_por_nombre[nombre] for nombre in json.loads(nombres)
+                             if nombre in productos_por_nombre], id)
+            ultimo_pedido = id
+            pedido.estado = EstadoPedido(estado)
+            pedido.fecha = fecha
+            pedido.total = total
+            pedido.promociones = tuple(json.loads(codigos)) if codigos else ()
+            clientes_por_id[cliente_id].historial_pedidos.append(pedido)
+        Pedido._siguiente_id = itertools.count(ultimo_pedido + 1)
+        
+        empleados = [Empleado(nombre, RolEmpleado(rol)) for nombre, rol in
+                     self.conexion.execute("SELECT nombre, rol FROM empleados ORDER BY id")]
+        
+        promociones = []
+        for codigo, descuento in self.conexion.execute("SELECT codigo, descuento FROM promociones ORDER BY rowid"):
+            frecuentes = [clientes_por_id[cliente_id] for (cliente_id,) in self.conexion.execute(
+                "SELECT cliente_id FROM promocion_clientes WHERE codigo = ? ORDER BY rowid", (codigo,))]
+            promociones.append(Promocion(codigo, descuento, frecuentes))
+        
+        inventario = Inventario()
+        for ingrediente, cantidad in self.conexion.execute("SELECT ingrediente, cantidad FROM inventario ORDER BY rowid"):
+            inventario.ingredientes[ingrediente] = cantidad
+        
+        return {
+            "clientes": clientes,
+            "productos": productos,
+            "empleados": empleados,
+            "promociones": promociones,
+            "inventario": inventario
+        }
+    
+    def _operaciones_productos(self, productos):
+        operaciones = []
+        for producto in productos:
+            if isinstance(producto, Bebida):
+                fila = (producto.nombre, "Bebida", producto.precio, producto.tamaño, producto.tipo,
+                        json.dumps(producto.opciones_personalizadas), None, None)
+            else:
+                fila = (producto.nombre, "Postre", producto.precio, None, None, None,
+                        int(producto.vegano), int(producto.sin_gluten))
+            fila += (json.dumps(producto.ingredientes_requeridos),)
+            # ON CONFLICT en lugar de REPLACE: actualizar no cambia el rowid, que da el orden del catálogo
+            operaciones.append(("INSERT INTO productos (nombre, clase, precio, tamaño, tipo, opciones, "
+                                "vegano, sin_gluten, ingredientes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                                "ON CONFLICT (nombre) DO UPDATE SET clase = excluded.clase, precio = excluded.precio, "
+                                "tamaño = excluded.tamaño, tipo = excluded.tipo, opciones = excluded.opciones, "
+                                "vegano = excluded.vegano, sin_gluten = excluded.sin_gluten, "
+                                "ingredientes = excluded.ingredientes", fila))
+        return operaciones
+    
+    def guardar_todo(self, clientes, productos, empleados, promociones, inventario):
+        self._escribir(self._operaciones_productos(productos))
+        for cliente in clientes:
+            self.guardar_cliente(cliente)
+        for empleado in empleados:
+            self.guardar_empleado(empleado)
+        for promocion in promociones:
+            self.guardar_promocion(promocion)
+        self.guardar_stock(inventario, inventario.ingredientes)
+    
+    def guardar_cliente(self, cliente):
+        self._escribir([("INSERT OR REPLACE INTO clientes VALUES (?, ?)", (cliente.id, cliente.nombre))])
+    
+    def guardar_lote(self, clientes=(), productos=(), promociones=(), inventario=None, ingredientes=()):
+        operaciones = [("INSERT OR REPLACE INTO clientes VALUES (?, ?)", (cliente.id, cliente.nombre))
+                       for cliente in clientes]
+        operaciones += self._operaciones_productos(productos)
+        for promocion, nuevos in promociones:
+            operaciones.append(("INSERT INTO promociones VALUES (?, ?) "
+                                "ON CONFLICT (codigo) DO UPDATE SET descuento = excluded.descuento",
+                                (promocion.codigo, promocion.descuento)))
+            operaciones += [("INSERT OR IGNORE INTO promocion_clientes VALUES (?, ?)", (promocion.codigo, cliente.id))
+                            for cliente in nuevos]
+        if inventario is not None:
+            operaciones += self._operaciones_stock(inventario, ingredientes)
+        self._escribir(operaciones)
+    
+    def guardar_empleado(self, empleado):
+        self._escribir([("INSERT INTO empleados (nombre, rol) VALUES (?, ?)", (empleado.nombre, empleado.rol.value))])
+    
+    def guardar_promocion(self, promocion):
+        operaciones = [("INSERT OR REPLACE INTO promociones VALUES (?, ?)", (promocion.codigo, promocion.descuento))]
+        for cliente in promocion.clientes_frecuentes:
+            operaciones.append(("INSERT OR IGNORE INTO promocion_clientes VALUES (?, ?)",
+                                (promocion.codigo, cliente.id)))
+        self._escribir(operaciones)
+    
+    def _operaciones_stock(self, inventario, ingredientes):
+        return [("INSERT OR REPLACE INTO inventario VALUES (?, ?)", (ing, inventario.ingredientes[ing]))
+                for ing in ingredientes]
+    
+    def guardar_stock(self, inventario, ingredientes):
+        self._escribir(self._operaciones_stock(inventario, ingredientes))
+    
+    def _operacion_pedido(self, cliente, pedido):
+        return ("INSERT INTO pedidos (id, cliente_id, estado, productos, fecha, total, promociones) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (pedido.id, cliente.id, pedido.estado.value, json.dumps([producto.nombre for producto in pedido.productos]),
+                 pedido.fecha, pedido.total, json.dumps(pedido.promociones)))
+    
+    def guardar_pedido(self, cliente, pedido, inventario):
+        # El pedido y el stock descontado se escriben en la misma transacción
+        operaciones = [self._operacion_pedido(cliente, pedido)]
+        operaciones += self._operaciones_stock(inventario, pedido.calcular_ingredientes())
+        self._escribir(operaciones)
+    
+    def guardar_pedidos(self, pedidos, inventario):
+        # El stock de cada ingrediente se escribe una sola vez para todo el lote
+        if not pedidos:
+            return
+        operaciones = [self._operacion_pedido(cliente, pedido) for cliente, pedido in pedidos]
+        ingredientes = set()
+        for _, pedido in pedidos:
+            ingredientes.update(pedido.calcular_ingredientes())
+        operaciones += self._operaciones_stock(inventario, ingredientes)
+        self._escribir(operaciones)
+    
+    def guardar_estado_pedido(self, pedido):
+        self._escribir([("UPDATE pedidos SET estado = ? WHERE id = ?", (pedido.estado.value, pedido.id))])
+    
+    def cerrar(self):
+        if self._hilo:
+            self._cola.put(None)
+            self._hilo.join()
+            self._hilo = None
+        self.conexion.close()
+
+class HistorialPerezoso:
+    # Historial de un cliente guardado en una instantánea: se lee del archivo la primera vez que se usa
+    __slots__ = ("_instantanea", "_desplazamiento", "_cantidad", "_pedidos")
+    
+    def __init__(self, instantanea, desplazamiento, cantidad):
+        self._instantanea = instantanea
+        self._desplazamiento = desplazamiento
+        self._cantidad = cantidad
+        self._pedidos = None
+    
+    def _cargar(self):
+        if self._pedidos is None:
+            self._pedidos = self._instantanea.leer_pedidos(self._desplazamiento, self._cantidad)
+        return self._pedidos
+    
+    def __len__(self):
+        return self._cantidad if self._pedidos is None else len(self._pedidos)
+    
+    def __iter__(self):
+        return iter(self._cargar())
+    
+    def __getitem__(self, indice):
+        return self._cargar()[indice]
+    
+    def append(self, pedido):
+        self._cargar().append(pedido)
+
+class Instantanea:
+    # Formato binario versionado. Todas las cadenas van en una tabla y se referencian por índice.
+    # Cabecera: firma, versión y el desplazamiento de cada sección
+    FIRMA = b"CAFESNAP"
+    VERSION = 4
+    CABECERA = struct.Struct("<8sHxx8Q")
+    SECCIONES = ("cadenas", "productos", "inventario", "clientes", "empleados", "promociones", "pedidos", "derivados")
+    NINGUNA = 0xFFFFFFFF
+    
+    CONTADOR = struct.Struct("<I")
+    PRODUCTO = struct.Struct("<BIdIIBBHH")
+    INDICE = struct.Struct("<I")
+    CANTIDAD = struct.Struct("<Id")
+    CLIENTE = struct.Struct("<qIIQ")
+    EMPLEADO = struct.Struct("<II")
+    PROMOCION = struct.Struct("<IqI")
+    ID_CLIENTE = struct.Struct("<q")
+    PEDIDO = struct.Struct("<qIdHHq")
+    
+    def __init__(self, ruta):
+        self._archivo = open(ruta, "rb")
+        self._mapa = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        firma, version, *desplazamientos = self.CABECERA.unpack_from(self._mapa, 0)
+        if firma != self.FIRMA or version != self.VERSION:
+            self.cerrar()
+            raise ValueError(f"Instantánea no válida o de otra versión: {ruta}")
+        self.secciones = dict(zip(self.SECCIONES, desplazamientos))
+        
+        # Tabla de cadenas: desplazamientos fijos y los textos se decodifican al pedirlos
+        inicio = self.secciones["cadenas"]
+        self._cantidad_cadenas = self.CONTADOR.unpack_from(self._mapa, inicio)[0]
+        self._indices_cadenas = inicio + 4
+        self._textos = self._indices_cadenas + (self._cantidad_cadenas + 1) * 4
+        self._cadenas = {}
+        self.productos = []
+    
+    def cadena(self, indice):
+        if indice == self.NINGUNA:
+            return None
+        texto = self._cadenas.get(indice)
+        if texto is None:
+            inicio, fin = struct.unpack_from("<II", self._mapa, self._indices_cadenas + indice * 4)
+            texto = self._cadenas[indice] = self._mapa[self._textos + inicio:self._textos + fin].decode("utf-8")
+        return texto
+    
+    def _registros(self, seccion, formato):
+        # Secciones de registros de tamaño fijo: contador + registros
+        inicio = self.secciones[seccion]
+        cantidad = self.CONTADOR.unpack_from(self._mapa, inicio)[0]
+        return formato.iter_unpack(self._mapa[inicio + 4:inicio + 4 + cantidad * formato.size])
+    
+    def leer_productos(self):
+        posicion = self.secciones["productos"]
+        cantidad = self.CONTADOR.unpack_from(self._mapa, posicion)[0]
+        posicion += 4
+        for _ in range(cantidad):
+            clase, nombre, precio, tamaño, tipo, vegano, sin_gluten, n_opciones, n_ingredientes = \
+                self.PRODUCTO.unpack_from(self._mapa, posicion)
+            posicion += self.PRODUCTO.size
+            # El precio va como double para admitir centavos; los enteros vuelven a ser enteros
+            precio = int(precio) if precio.is_integer() else precio
+            opciones = []
+            for _ in range(n_opciones):
+                opciones.append(self.cadena(self.INDICE.unpack_from(self._mapa, posicion)[0]))
+                posicion += self.INDICE.size
+            ingredientes = {}
+            for _ in range(n_ingredientes):
+                ingrediente, cant = self.CANTIDAD.unpack_from(self._mapa, posicion)
+                ingredientes[self.cadena(ingrediente)] = cant
+                posicion += self.CANTIDAD.size
+            if clase == 0:
+                producto = Bebida(self.cadena(nombre), precio, self.cadena(tamaño), self.cadena(tipo), opciones)
+            else:
+                producto = Postre(self.cadena(nombre), precio, bool(vegano), bool(sin_gluten))
+            producto.ingredientes_requeridos = ingredientes
+            self.productos.append(producto)
+        return self.productos
+    
+    def leer_pedidos(self, posicion, cantidad):
+        pedidos = []
+        for _ in range(cantidad):
+            id, estado, fecha, n_productos, n_promociones, total = self.PEDIDO.unpack_from(self._mapa, posicion)
+            posicion += self.PEDIDO.size
+            indices = struct.unpack_from(f"<{n_productos}I", self._mapa, posicion)
+            posicion += 4 * n_productos
+            codigos = struct.unpack_from(f"<{n_promociones}I", self._mapa, posicion)
+            posicion += 4 * n_promociones
+            pedido = Pedido([self.productos[i] for i in indices], id)
+            pedido.estado = EstadoPedido(self.cadena(estado))
+            pedido.fecha = None if math.isnan(fecha) else fecha
+            pedido.total = None if total < 0 else total
+            pedido.promociones = tuple(self.cadena(codigo) for codigo in codigos)
+            pedidos.append(pedido)
+        return pedidos
+    
+    def cargar(self):
+        productos = self.leer_productos()
+        
+        clientes = []
+        for id, nombre, n_pedidos, desplazamiento in self._registros("clientes", self.CLIENTE):
+            cliente = Cliente(self.cadena(nombre), id)
+            cliente.historial_pedidos = HistorialPerezoso(self, desplazamiento, n_pedidos)
+            clientes.append(cliente)
+        clientes_por_id = {cliente.id: cliente for cliente in clientes}
+        if clientes:
+            Cliente._siguiente_id = itertools.count(max(clientes_por_id) + 1)
+        
+        inventario = Inventario()
+        for ingrediente, cantidad in self._registros("inventario", self.CANTIDAD):
+            inventario.ingredientes[self.cadena(ingrediente)] = cantidad
+        
+        empleados = [Empleado(self.cadena(nombre), RolEmpleado(self.cadena(rol)))
+                     for nombre, rol in self._registros("empleados", self.EMPLEADO)]
+        
+        promociones = []
+        posicion = self.secciones["promociones"]
+        cantidad = self.CONTADOR.unpack_from(self._mapa, posicion)[0]
+        posicion += 4
+        for _ in range(cantidad):
+            codigo, descuento, n_clientes = self.PROMOCION.unpack_from(self._mapa, posicion)
+            posicion += self.PROMOCION.size
+            ids = struct.unpack_from(f"<{n_clientes}q", self._mapa, posicion)
+            posicion += 8 * n_clientes
+            promociones.append(Promocion(self.cadena(codigo), descuento, [clientes_por_id[i] for i in ids]))
+        
+        inicio = self.secciones["derivados"]
+        largo = self.CONTADOR.unpack_from(self._mapa, inicio)[0]
+        derivados = json.loads(self._mapa[inicio + 4:inicio + 4 + largo]) if largo else None
+        if derivados:
+            Pedido._siguiente_id = itertools.count(derivados["siguiente_pedido"])
+        
+        return {
+            "clientes": clientes,
+            "productos": productos,
+            "empleados": empleados,
+            "promociones": promociones,
+            "inventario": inventario,
+            "derivados": derivados
+        }
+    
+    def cerrar(self):
+        self._mapa.close()
+        self._archivo.close()
+    
+    @classmethod
+    def guardar(cls, servicio, ruta):
+        cadenas = {}
+        
+        def cadena(texto):
+            if texto is None:
+                return cls.NINGUNA
+            indice = cadenas.get(texto)
+            if indice is None:
+                indice = cadenas[texto] = len(cadenas)
+            return indice
+        
+        secciones = {}
+        partes = []
+        posicion = cls.CABECERA.size
+        
+        def agregar(nombre, datos):
+            nonlocal posicion
+            secciones[nombre] = posicion
+            partes.append(datos)
+            posicion += len(datos)
+        
+        datos = bytearray(cls.CONTADOR.pack(len(servicio.productos)))
+        indice_producto = {}
+        for i, producto in enumerate(servicio.productos):
+            indice_producto[id(producto)] = i
+            if isinstance(producto, Bebida):
+                opciones = producto.opciones_personalizadas
+                datos += cls.PRODUCTO.pack(0, cadena(producto.nombre), producto.precio, cadena(producto.tamaño),
+                                           cadena(producto.tipo), 0, 0, len(opciones), len(producto.ingredientes_requeridos))
+            else:
+                opciones = []
+                datos += cls.PRODUCTO.pack(1, cadena(producto.nombre), producto.precio, cls.NINGUNA, cls.NINGUNA,
+                                           int(producto.vegano), int(producto.sin_gluten), 0,
+                                           len(producto.ingredientes_requeridos))
+            for opcion in opciones:
+                datos += cls.INDICE.pack(cadena(opcion))
+            for ingrediente, cant in producto.ingredientes_requeridos.items():
+                datos += cls.CANTIDAD.pack(cadena(ingrediente), cant)
+        bloque_productos = bytes(datos)
+        
+        # Los pedidos de cada cliente quedan contiguos; el cliente guarda dónde empiezan
+        pedidos = bytearray()
+        ubicacion_pedidos = []
+        ultimo_pedido = 0
+        for cliente in servicio.clientes:
+            ubicacion_pedidos.append((len(pedidos), len(cliente.historial_pedidos)))
+            for pedido in cliente.historial_pedidos:
+                ultimo_pedido = max(ultimo_pedido, pedido.id)
+                pedidos += cls.PEDIDO.pack(pedido.id, cadena(pedido.estado.value),
+                                           pedido.fecha if pedido.fecha is not None else math.nan,
+                                           len(pedido.productos), len(pedido.promociones),
+                                           pedido.total if pedido.total is not None else -1)
+                pedidos += struct.pack(f"<{len(pedido.productos)}I",
+                                       *[indice_producto[id(producto)] for producto in pedido.productos])
+                pedidos += struct.pack(f"<{len(pedido.promociones)}I",
+                                       *[cadena(codigo) for codigo in pedido.promociones])
+        
+        inventario = bytearray(cls.CONTADOR.pack(len(servicio.inventario.ingredientes)))
+        for ingrediente, cantidad in servicio.inventario.ingredientes.items():
+            inventario += cls.CANTIDAD.pack(cadena(ingrediente), cantidad)
+        
+        empleados = bytearray(cls.CONTADOR.pack(len(servicio.empleados)))
+        for empleado in servicio.empleados:
+            empleados += cls.EMPLEADO.pack(cadena(empleado.nombre), cadena(empleado.rol.value))
+        
+        promociones = bytearray(cls.CONTADOR.pack(len(servicio.promociones)))
+        for promocion in servicio.promociones:
+            promociones += cls.PROMOCION.pack(cadena(promocion.codigo), promocion.descuento,
+                                              len(promocion.clientes_frecuentes))
+            promociones += struct.pack(f"<{len(promocion.clientes_frecuentes)}q",
+                                       *[cliente.id for cliente in promocion.clientes_frecuentes])
+        
+        nombres_clientes = [cadena(cliente.nombre) for cliente in servicio.clientes]
+        # en_curso: (cliente, pedido) sin entregar, para volver a encolarlos sin leer todos los historiales
+        derivados = json.dumps({"estadisticas": servicio.estadisticas.exportar(),
+                                "pronostico": servicio.pronostico.exportar(),
+                                "siguiente_pedido": ultimo_pedido + 1,
+                                "en_curso": [[cliente.id, pedido.id]
+                                             for cliente, pedido, _ in servicio.cola_produccion.activos()]
+                                }).encode("utf-8")
+        
+        # La tabla de cadenas se arma al final, cuando ya se conocen todas
+        textos = [texto.encode("utf-8") for texto in cadenas]
+        tabla = bytearray(cls.CONTADOR.pack(len(textos)))
+        desplazamientos = list(itertools.accumulate((len(texto) for texto in textos), initial=0))
+        tabla += struct.pack(f"<{len(desplazamientos)}I", *desplazamientos)
+        tabla += b"".join(textos)
+        
+        agregar("cadenas", bytes(tabla))
+        agregar("productos", bloque_productos)
+        agregar("inventario", bytes(inventario))
+        inicio_clientes = posicion
+        tamaño_clientes = 4 + cls.CLIENTE.size * len(servicio.clientes)
+        inicio_pedidos = inicio_clientes + tamaño_clientes + len(empleados) + len(promociones)
+        clientes = bytearray(cls.CONTADOR.pack(len(servicio.clientes)))
+        for cliente, nombre, (desplazamiento, cantidad) in zip(servicio.clientes, nombres_clientes, ubicacion_pedidos):
+            clientes += cls.CLIENTE.pack(cliente.id, nombre, cantidad, inicio_pedidos + desplazamiento)
+        agregar("clientes", bytes(clientes))
+        agregar("empleados", bytes(empleados))
+        agregar("promociones", bytes(promociones))
+        agregar("pedidos", bytes(pedidos))
+        agregar("derivados", cls.CONTADOR.pack(len(derivados)) + derivados)
+        
+        temporal = ruta + ".tmp"
+        with open(temporal, "wb") as archivo:
+            archivo.write(cls.CABECERA.pack(cls.FIRMA, cls.VERSION, *[secciones[nombre] for nombre in cls.SECCIONES]))
+            for parte in partes:
+                archivo.write(parte)
+        os.replace(temporal, ruta)
+
+class RepositorioInstantanea(Repositorio):
+    # Arranque rápido: carga desde la instantánea y delega las escrituras en otro repositorio.
+    # Si hubo escrituras después de la última instantánea (por ejemplo, un cierre inesperado),
+    # la marca de "sucio" obliga a cargar desde el repositorio de respaldo
+    def __init__(self, ruta, respaldo):
+        self.ruta = ruta
+        self.respaldo = respaldo
+        self.ruta_sucio = ruta + ".sucio"
+        self.instantanea = None
+        self._sucio = False
+    
+    def cargar(self):
+        if os.path.exists(self.ruta) and not os.path.exists(self.ruta_sucio):
+            try:
+                self.instantanea = Instantanea(self.ruta)
+                return self.instantanea.cargar()
+            except (OSError, ValueError, struct.error):
+                if self.instantanea:
+                    self.instantanea.cerrar()
+                self.instantanea = None
+        return self.respaldo.cargar()
+    
+    def _marcar_sucio(self):
+        if not self._sucio:
+            self._sucio = True
+            open(self.ruta_sucio, "w").close()
+    
+    def guardar_todo(self, clientes, productos, empleados, promociones, inventario):
+        self._marcar_sucio()
+        self.respaldo.guardar_todo(clientes, productos, empleados, promociones, inventario)
+    
+    def guardar_cliente(self, cliente):
+        self._marcar_sucio()
+        self.respaldo.guardar_cliente(cliente)
+    
+    def guardar_empleado(self, empleado):
+        self._marcar_sucio()
+        self.respaldo.guardar_empleado(empleado)
+    
+    def guardar_promocion(self, promocion):
+        self._marcar_sucio()
+        self.respaldo.guardar_promocion(promocion)
+    
+    def guardar_stock(self, inventario, ingredientes):
+        self._marcar_sucio()
+        self.respaldo.guardar_stock(inventario, ingredientes)
+    
+    def guardar_pedido(self, cliente, pedido, inventario):
+        self._marcar_sucio()
+        self.respaldo.guardar_pedido(cliente, pedido, inventario)
+    
+    def guardar_pedidos(self, pedidos, inventario):
+        if pedidos:
+            self._marcar_sucio()
+        self.respaldo.guardar_pedidos(pedidos, inventario)
+    
+    def guardar_estado_pedido(self, pedido):
+        self._marcar_sucio()
+        self.respaldo.guardar_estado_pedido(pedido)
+    
+    def guardar_lote(self, clientes=(), productos=(), promociones=(), inventario=None, ingredientes=()):
+        self._marcar_sucio()
+        self.respaldo.guardar_lote(clientes, productos, promociones, inventario, ingredientes)
+    
+    def suscribir_fallos(self, observador):
+        self.respaldo.suscribir_fallos(observador)
+    
+    def guardar_estado(self, servicio):
+        self.respaldo.guardar_estado(servicio)
+        if self.instantanea:
+            if not self._sucio:
+                # Nada cambió desde que se cargó
+                return
+            # Se leen los historiales pendientes antes de soltar el archivo
+            for cliente in servicio.clientes:
+                if isinstance(cliente.historial_pedidos, HistorialPerezoso):
+                    cliente.historial_pedidos = list(cliente.historial_pedidos)
+            self.instantanea.cerrar()
+            self.instantanea = None
+        Instantanea.guardar(servicio, self.ruta)
+        if os.path.exists(self.ruta_sucio):
+            os.remove(self.ruta_sucio)
+        self._sucio = False
+    
+    def cerrar(self):
+        self.respaldo.cerrar()
+        if self.instantanea:
+            self.instantanea.cerrar()
+            self.instantanea = None
+
+class DesglosePrecio:
+    __slots__ = ("subtotal", "descuentos", "impuestos", "total")
+    
+    def __init__(self, subtotal, descuentos, impuestos, total):
+        # Todo en centavos; descuentos e impuestos son listas de (nombre, monto)
+        self.subtotal = subtotal
+        self.descuentos = descuentos
+        self.impuestos = impuestos
+        self.total = total
+
+class MotorPrecios:
+    def __init__(self, impuestos=()):
+        # (nombre, tasa en %) que se cobran sobre el total ya descontado
+        self.impuestos = list(impuestos)
+    
+    @metricas.medir("desglosar_precio")
+    def desglosar(self, subtotal, cliente, promociones):
+        # Las promociones se acumulan: cada una descuenta sobre lo que dejó la anterior
+        restante = subtotal
+        descuentos = []
+        for promocion in promociones:
+            if cliente is not None and promocion.es_elegible(cliente):
+                monto = restante - promocion.aplicar_descuento(cliente, restante)
+                descuentos.append((promocion.codigo, monto))
+                restante -= monto
+        impuestos = [(nombre, porcentaje(restante, tasa)) for nombre, tasa in self.impuestos]
+        return DesglosePrecio(subtotal, descuentos, impuestos, restante + sum(monto for _, monto in impuestos))
+
+class Carrito:
+    __slots__ = ("productos", "centavos", "subtotal", "promociones", "_desglose", "_clave_desglose")
+    
+    def __init__(self):
+        self.productos = []
+        # Precio de cada línea al agregarla: si el catálogo cambia después, quitar resta lo mismo que se sumó
+        self.centavos = []
+        # Subtotal en centavos, se ajusta en cada alta o baja
+        self.subtotal = 0
+        self.promociones = []
+        # Último desglose calculado; se descarta cuando el carrito cambia
+        self._desglose = None
+        self._clave_desglose = None
+    
+    def agregar(self, producto):
+        centavos = a_centavos(producto.precio)
+        self.productos.append(producto)
+        self.centavos.append(centavos)
+        self.subtotal += centavos
+        self._desglose = None
+    
+    def quitar(self, indice):
+        producto = self.productos.pop(indice)
+        self.subtotal -= self.centavos.pop(indice)
+        self._desglose = None
+        return producto
+    
+    def agregar_promocion(self, promocion):
+        if promocion not in self.promociones:
+            self.promociones.append(promocion)
+            self._desglose = None
+    
+    def vaciar(self):
+        self.productos = []
+        self.centavos = []
+        self.subtotal = 0
+        self.promociones = []
+        self._desglose = None
+    
+    def desglose(self, motor, cliente):
+        # Solo depende del subtotal, así que recalcular no recorre las líneas del carrito.
+        # La clave incluye la versión de cada promoción: si cambia su descuento o sus clientes, se recalcula
+        clave = (cliente.id if cliente is not None else None,
+                 tuple(promocion.version for promocion in self.promociones))
+        if self._desglose is None or self._clave_desglose != clave:
+            self._desglose = motor.desglosar(self.subtotal, cliente, self.promociones)
+            self._clave_desglose = clave
+        return self._desglose
+
+def medir_demanda(tamaños=(10, 100, 10_000), productos_por_medicion=200_000, semilla=0):
+    # Demanda de ingredientes de un pedido: recorriendo cada producto y armando el diccionario en cada
+    # llamada, como antes, contra calcular_ingredientes, que suma la demanda precalculada de cada producto
+    aleatorio = random.Random(semilla)
+    catalogo = CafeteriaService().productos
+    
+    def sumar_receta(receta, veces, destino):
+        for componente, cantidad in receta.componentes.items():
+            if isinstance(componente, Receta):
+                sumar_receta(componente, veces * cantidad, destino)
+            else:
+                destino[componente] = destino.get(componente, 0) + cantidad * veces
+    
+    def por_llamada(pedido):
+        ingredientes_necesarios = {}
+        for producto in pedido.productos:
+            if producto.receta:
+                sumar_receta(producto.receta, 1, ingredientes_necesarios)
+            elif isinstance(producto, Bebida):
+                for opcion in producto.opciones_personalizadas:
+                    ingredientes_necesarios[opcion] = ingredientes_necesarios.get(opcion, 0) + 1
+        return ingredientes_necesarios
+    
+    resultados = []
+    for tamaño in tamaños:
+        pedido = Pedido(aleatorio.choices(catalogo, k=tamaño))
+        repeticiones = max(1, productos_por_medicion // tamaño)
+        fila = {"productos": tamaño, "repeticiones": repeticiones,
+                "mismo_resultado": por_llamada(pedido) == pedido.calcular_ingredientes()}
+        for nombre, calcular in (("por_llamada", por_llamada), ("precalculada", Pedido.calcular_ingredientes)):
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                calcular(pedido)
+            fila[f"{nombre}_us"] = (time.perf_counter() - inicio) / repeticiones * 1e6
+        resultados.append(fila)
+    return resultados
+
+def medir_memoria(pedidos=1_000_000, semilla=0):
+    # Bytes que retiene cada pedido del historial: una clase común (con __dict__) que guarda sus productos en
+    # una lista, como antes, contra Pedido, con __slots__ y los productos en una tupla. Los productos son
+    # los mismos objetos en los dos casos, así que solo se cuenta lo que agrega cada pedido
+    catalogo = CafeteriaService().productos
+    
+    class PedidoConDiccionario:
+        def __init__(self, productos, id):
+            self.id = id
+            self.productos = list(productos)
+            self.estado = EstadoPedido.ENTREGADO
+            self.fecha = None
+            self.total = None
+            self.promociones = ()
+    
+    def crear_con_diccionario(productos, id):
+        return PedidoConDiccionario(productos, id)
+    
+    def crear_con_slots(productos, id):
+        pedido = Pedido(productos, id)
+        pedido.estado = EstadoPedido.ENTREGADO
+        return pedido
+    
+    resultados = {"pedidos": pedidos}
+    for nombre, crear in (("con_diccionario", crear_con_diccionario), ("con_slots", crear_con_slots)):
+        aleatorio = random.Random(semilla)
+        tracemalloc.start()
+        historial = [crear(aleatorio.choices(catalogo, k=aleatorio.randint(1, 3)), i + 1) for i in range(pedidos)]
+        retenidos = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        resultados[nombre] = {"bytes_por_pedido": retenidos / pedidos, "total_mb": retenidos / 2 ** 20}
+        del historial
+    return resultados
+
+def medir_estadisticas(pedidos=1_000_000, clientes=100_000, consultas=1000, semilla=0):
+    # Un millón de pedidos sintéticos registrados de a tandas (solo se cronometra registrar); después,
+    # los mejores clientes y los más vendidos desde el ranking contra recorrer todas las claves con nlargest
+    aleatorio = random.Random(semilla)
+    catalogo = CafeteriaService().productos
+    lista_clientes = [Cliente(f"Cliente {i + 1}", id=i + 1) for i in range(clientes)]
+    estadisticas = Estadisticas()
+    ahora = time.time()
+    registro = 0.0
+    for comienzo in range(0, pedidos, 10_000):
+        tanda = []
+        for i in range(comienzo, min(comienzo + 10_000, pedidos)):
+            pedido = Pedido(aleatorio.choices(catalogo, k=aleatorio.randint(1, 3)))
+            pedido.fecha = ahora - (pedidos - i) * 30
+            pedido.total = pedido.calcular_total()
+            tanda.append((aleatorio.choice(lista_clientes), pedido))
+        inicio = time.perf_counter()
+        for cliente, pedido in tanda:
+            estadisticas.registrar(cliente, pedido)
+        registro += time.perf_counter() - inicio
+    
+    tiempos = {}
+    for nombre, consultar in (
+            ("ranking", lambda: (estadisticas.mejores_clientes(3), estadisticas.productos_mas_vendidos())),
+            ("recorriendo_todo", lambda: (
+                heapq.nlargest(3, estadisticas.ingresos_por_cliente.items(), key=lambda item: item[1]),
+                heapq.nlargest(5, estadisticas.unidades_por_producto.items(), key=lambda item: item[1])))):
+        inicio = time.perf_counter()
+        for _ in range(consultas):
+            resultado = consultar()
+        tiempos[nombre] = ((time.perf_counter() - inicio) / consultas * 1e6, resultado)
+    return {
+        "pedidos": pedidos,
+        "clientes": clientes,
+        "registrar_us": registro / pedidos * 1e6,
+        "consulta_ranking_us": tiempos["ranking"][0],
+        "consulta_recorriendo_todo_us": tiempos["recorriendo_todo"][0],
+        "mismo_resultado": tiempos["ranking"][1] == tiempos["recorriendo_todo"][1]
+    }
+
+def medir_promociones(codigos=5000, clientes=50_000, por_promocion=20, consultas=1000, semilla=0):
+    # Miles de códigos y decenas de miles de clientes frecuentes. Recorriendo la lista, como antes: buscar
+    # el código compara uno por uno y la elegibilidad busca al cliente en la lista de la promoción. Con
+    # IndicePromociones: diccionario por código y, por cliente, solo las promociones en las que participa
+    aleatorio = random.Random(semilla)
+    lista_clientes = [Cliente(f"Cliente {i + 1}", id=i + 1) for i in range(clientes)]
+    promociones = [Promocion(f"PROMO{i}", aleatorio.randint(5, 50), aleatorio.sample(lista_clientes, por_promocion))
+                   for i in range(codigos)]
+    indice = IndicePromociones(promociones)
+    solicitudes = [(aleatorio.choice(promociones).codigo, aleatorio.choice(lista_clientes)) for _ in range(consultas)]
+    total = 10_000
+    
+    def buscar_lineal(codigo):
+        return next((promocion for promocion in promociones if promocion.codigo == codigo), None)
+    
+    def aplicables_lineal(cliente):
+        resultados = [(promocion, total - porcentaje(total, promocion.descuento))
+                      for promocion in promociones if cliente in promocion.clientes_frecuentes]
+        resultados.sort(key=lambda resultado: resultado[1])
+        return resultados
+    
+    variantes = {
+        "lineal": (buscar_lineal, lambda promocion, cliente: cliente in promocion.clientes_frecuentes, aplicables_lineal),
+        "indice": (indice.buscar, Promocion.es_elegible, lambda cliente: indice.evaluar(cliente, total))
+    }
+    resultados = {"codigos": codigos, "clientes": clientes, "consultas": consultas}
+    respuestas = {}
+    for nombre, (buscar, es_elegible, aplicables) in variantes.items():
+        inicio = time.perf_counter()
+        encontradas = [buscar(codigo) for codigo, _ in solicitudes]
+        busqueda = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        elegibles = [es_elegible(promocion, cliente) for promocion, (_, cliente) in zip(encontradas, solicitudes)]
+        elegibilidad = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        por_cliente = [[promocion.codigo for promocion, _ in aplicables(cliente)] for _, cliente in solicitudes]
+        evaluacion = time.perf_counter() - inicio
+        respuestas[nombre] = (encontradas, elegibles, [sorted(codigos) for codigos in por_cliente])
+        resultados[nombre] = {"buscar_us": busqueda / consultas * 1e6, "elegibilidad_us": elegibilidad / consultas * 1e6,
+                              "aplicables_us": evaluacion / consultas * 1e6}
+    resultados["mismo_resultado"] = respuestas["lineal"] == respuestas["indice"]
+    return resultados
+
+def medir_pronostico(dias=30, pedidos_por_hora=60, semilla=0):
+    # Un mes sintético de consumos, abierto de 7 a 21 con picos a media mañana y al mediodía, repetido
+    # sobre PronosticoStock.registrar en orden cronológico. Se generan antes y solo se cronometra el registro
+    aleatorio = random.Random(semilla)
+    catalogo = CafeteriaService().productos
+    inventario = Inventario()
+    pronostico = PronosticoStock(inventario)
+    comienzo = (int(time.time()) // 86400 - dias) * 86400
+    eventos = []
+    for dia in range(dias):
+        for hora in range(7, 21):
+            intensidad = 1.5 if hora in (8, 9, 13) else 1.0
+            inicio_hora = comienzo + dia * 86400 + hora * 3600
+            cantidad = aleatorio.randint(0, int(2 * pedidos_por_hora * intensidad))
+            for momento in sorted(aleatorio.uniform(0, 3600) for _ in range(cantidad)):
+                pedido = Pedido(aleatorio.choices(catalogo, k=aleatorio.randint(1, 3)))
+                eventos.append((pedido.calcular_ingredientes(), inicio_hora + momento))
+    inicio = time.perf_counter()
+    for ingredientes, momento in eventos:
+        pronostico.registrar(ingredientes, momento)
+    segundos = time.perf_counter() - inicio
+    return {
+        "dias": dias,
+        "eventos": len(eventos),
+        "microsegundos_por_evento": segundos / len(eventos) * 1e6,
+        "ingredientes": len(pronostico.tasas)
+    }
+
+def medir_catalogo(productos=100_000, consultas=2000, semilla=0):
+    # Catálogo sintético con nombres acentuados. Tres clases de consulta: prefijo de cualquier palabra,
+    # texto con otros acentos o mayúsculas que el nombre, y texto combinado con filtros
+    aleatorio = random.Random(semilla)
+    sabores = ["Café", "Té", "Limón", "Arándanos", "Chocolate", "Vainilla", "Fresa", "Canela", "Maracuyá", "Plátano"]
+    bases = ["Muffin", "Galleta", "Pan", "Latte", "Frappé", "Brownie", "Tarta", "Batido", "Croissant", "Infusión"]
+    catalogo = []
+    for i in range(productos):
+        nombre = f"{aleatorio.choice(bases)} de {aleatorio.choice(sabores)} {i}"
+        if i % 2:
+            catalogo.append(Bebida(nombre, 30, aleatorio.choice(["Pequeño", "Mediano", "Grande"]),
+                                   aleatorio.choice(["Caliente", "Frío"]), []))
+        else:
+            catalogo.append(Postre(nombre, 25, aleatorio.random() < 0.3, aleatorio.random() < 0.2))
+    inicio = time.perf_counter()
+    indice = IndiceCatalogo(catalogo)
+    construccion = time.perf_counter() - inicio
+    
+    def texto_con_acentos():
+        # Lo que se escribe no coincide con el nombre guardado en acentos ni en mayúsculas
+        palabra = aleatorio.choice(sabores)
+        return aleatorio.choice([normalizar(palabra), palabra.upper()])[:aleatorio.randint(3, 6)]
+    
+    clases = {
+        "prefijo": lambda: ((normalizar(aleatorio.choice(bases + sabores))[:aleatorio.randint(2, 5)],), {}),
+        "sin_acentos": lambda: ((texto_con_acentos(),), {}),
+        "filtrada": lambda: ((aleatorio.choice(["", normalizar(aleatorio.choice(sabores))[:3]]),),
+                             aleatorio.choice([{"vegano": True}, {"vegano": True, "sin_gluten": True},
+                                               {"tipo": "Frío"}, {"tipo": "Caliente", "tamaño": "Grande"}]))
+    }
+    resultados = {"productos": productos, "construccion_ms": construccion * 1000}
+    for nombre, generar in clases.items():
+        solicitudes = [generar() for _ in range(consultas)]
+        latencias = Histograma()
+        encontrados = 0
+        for args, filtros in solicitudes:
+            inicio = time.perf_counter()
+            encontrados += len(indice.buscar(*args, **filtros))
+            latencias.registrar(time.perf_counter() - inicio)
+        resultados[nombre] = {"p50_us": latencias.percentil(50) * 1e6, "p99_us": latencias.percentil(99) * 1e6,
+                              "promedio_us": latencias.suma / latencias.cantidad * 1e6,
+                              "resultados_promedio": encontrados / consultas}
+    return resultados
+
+def medir_precios(lineas=500, mutaciones=5000, semilla=0):
+    # Carrito grande que se vuelve a cotizar después de cada alta o baja, con dos promociones y un impuesto
+    aleatorio = random.Random(semilla)
+    productos = [Bebida("Café", 30.5, "Mediano", "Caliente", []), Postre("Galleta", 19.99, False, False)]
+    cliente = Cliente("Medición", id=0)
+    promociones = [Promocion("A", 10, [cliente]), Promocion("B", 5, [cliente])]
+    motor = MotorPrecios([("IVA", 16)])
+    carrito = Carrito()
+    for _ in range(lineas):
+        carrito.agregar(aleatorio.choice(productos))
+    for promocion in promociones:
+        carrito.agregar_promocion(promocion)
+    
+    def mutar(i):
+        if i % 2:
+            carrito.quitar(aleatorio.randrange(len(carrito.productos)))
+        else:
+            carrito.agregar(aleatorio.choice(productos))
+    
+    inicio = time.perf_counter()
+    for i in range(mutaciones):
+        mutar(i)
+        carrito.desglose(motor, cliente)
+    con_cache = time.perf_counter() - inicio
+    
+    # Referencia: sumar todas las líneas en cada cambio, como antes
+    inicio = time.perf_counter()
+    for i in range(mutaciones):
+        mutar(i)
+        subtotal = sum(a_centavos(producto.precio) for producto in carrito.productos)
+        motor.desglosar(subtotal, cliente, promociones)
+    sin_cache = time.perf_counter() - inicio
+    return {
+        "lineas": lineas,
+        "mutaciones": mutaciones,
+        "microsegundos_por_cambio": con_cache / mutaciones * 1e6,
+        "microsegundos_sumando_todo": sin_cache / mutaciones * 1e6
+    }
+
+def medir_importacion(filas=1_000_000, carpeta=None):
+    # Exporta e importa archivos grandes en CSV y JSON por línea. El segundo archivo de clientes repite los
+    # mismos ids, así que mide la actualización. El de inventario repite 1000 ingredientes: su pico de memoria
+    # es lo que cuesta el flujo en sí, sin contar los objetos que se crean
+    carpeta = carpeta or tempfile.mkdtemp()
+    servicio = CafeteriaService()
+    resultados = {"filas": filas}
+    for extension in ("csv", "jsonl"):
+        for tipo, generar in (
+                ("clientes", lambda: ({"id": 1_000_000 + i, "nombre": f"Cliente {i}"} for i in range(filas))),
+                ("inventario", lambda: ({"ingrediente": f"ingrediente {i % 1000}", "cantidad": i}
+                                        for i in range(filas)))):
+            ruta = os.path.join(carpeta, f"{tipo}.{extension}")
+            inicio = time.perf_counter()
+            escribir_filas(ruta, COLUMNAS_EXPORTACION[tipo], generar())
+            escritura = time.perf_counter() - inicio
+            
+            if tipo == "inventario":
+                tracemalloc.start()
+            inicio = time.perf_counter()
+            importadas, cantidad_errores, _ = servicio.importar(tipo, ruta)
+            lectura = time.perf_counter() - inicio
+            resultado = {"importadas": importadas, "errores": cantidad_errores,
+                         "escritura_filas_por_segundo": filas / escritura,
+                         "importacion_filas_por_segundo": filas / lectura}
+            if tipo == "inventario":
+                resultado["pico_memoria_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+                tracemalloc.stop()
+            resultados[f"{tipo}_{extension}"] = resultado
+            os.remove(ruta)
+    servicio.cerrar()
+    return resultados
+
+class GeneradorCarga:
+    # Carga sintética reproducible: con la misma semilla produce siempre la misma secuencia de eventos
+    def __init__(self, productos, ingredientes, clientes, codigos=(), semilla=0, zipf=1.1,
+                 productos_por_carrito=3, prob_promocion=0.2, reabastecer_cada=25):
+        self.aleatorio = random.Random(semilla)
+        self.ingredientes = list(ingredientes)
+        self.clientes = list(clientes)
+        self.codigos = list(codigos)
+        self.productos_por_carrito = productos_por_carrito
+        self.prob_promocion = prob_promocion
+        self.reabastecer_cada = reabastecer_cada
+        # Zipf sobre un orden de popularidad al azar: unos pocos productos se llevan casi todas las ventas
+        self.productos = list(productos)
+        self.aleatorio.shuffle(self.productos)
+        self.pesos = list(itertools.accumulate(1 / rango ** zipf for rango in range(1, len(self.productos) + 1)))
     
-    def actualizar_stock(self, ingrediente, cantidad):
-        self.ingredientes[ingrediente] = self.ingredientes.get(ingrediente, 0) + cantidad
-        return f"Inventario actualizado: {ingrediente} - {self.ingredientes[ingrediente]} unidades disponibles"
+    def carrito(self):
+        cantidad = self.aleatorio.randint(1, 2 * self.productos_por_carrito - 1)
+        return self.aleatorio.choices(self.productos, cum_weights=self.pesos, k=cantidad)
     
-    def verificar_disponibilidad(self, ingredientes_requeridos):
-        return all(self.ingredientes.get(ing, 0) >= cant for ing, cant in ingredientes_requeridos.items())
+    def eventos(self, pedidos):
+        # ("pedido", cliente, productos, código o None) y, cada tanto, ("reabastecer", ingrediente, cantidad)
+        for i in range(pedidos):
+            if self.reabastecer_cada and i % self.reabastecer_cada == self.reabastecer_cada - 1:
+                yield "reabastecer", self.aleatorio.choice(self.ingredientes), self.aleatorio.randint(10, 100)
+            codigo = None
+            if self.codigos and self.aleatorio.random() < self.prob_promocion:
+                codigo = self.aleatorio.choice(self.codigos)
+            yield "pedido", self.aleatorio.choice(self.clientes), self.carrito(), codigo
+
+def medir_pedidos(pedidos=20000, semilla=0, clientes=1000):
+    # Recorrido de punta a punta sobre la capa de dominio, sin Tk ni repositorio.
+    # Se corre dos veces con la misma semilla: la segunda, con tracemalloc, solo mide el pico de memoria
+    def correr(medir_memoria):
+        base = CafeteriaService()
+        inventario = Inventario()
+        # Alcanza para una parte de la carga: los reabastecimientos compiten con los pedidos y hay faltantes
+        stock_inicial = 3 * pedidos // 2
+        for ingrediente in base.inventario.ingredientes:
+            inventario.ingredientes[ingrediente] = stock_inicial
+        lista_clientes = [Cliente(f"Cliente {i + 1}", id=i + 1) for i in range(clientes)]
+        aleatorio = random.Random(semilla)
+        promociones = {codigo: Promocion(codigo, descuento, aleatorio.sample(lista_clientes, clientes // 10))
+                       for codigo, descuento in (("CARGA10", 10), ("CARGA20", 20), ("CARGA50", 50))}
+        generador = GeneradorCarga(base.productos, inventario.ingredientes, lista_clientes, promociones, semilla)
+        eventos = list(generador.eventos(pedidos))
+        
+        latencias = {"realizar_pedido": Histograma(), "aplicar_descuento": Histograma(),
+                     "actualizar_stock": Histograma()}
+        conteos = Counter()
+        if medir_memoria:
+            tracemalloc.start()
+        inicio = time.perf_counter()
+        for evento in eventos:
+            comienzo = time.perf_counter()
+            if evento[0] == "reabastecer":
+                inventario.actualizar_stock(evento[1], evento[2])
+                latencias["actualizar_stock"].registrar(time.perf_counter() - comienzo)
+                continue
+            _, cliente, productos, codigo = evento
+            pedido = Pedido(productos)
+            exito, _ = cliente.realizar_pedido(pedido, inventario)
+            latencias["realizar_pedido"].registrar(time.perf_counter() - comienzo)
+            conteos["exitosos" if exito else "sin_stock"] += 1
+            if exito and codigo:
+                comienzo = time.perf_counter()
+                total = pedido.calcular_total()
+                pedido.total = promociones[codigo].aplicar_descuento(cliente, total)
+                latencias["aplicar_descuento"].registrar(time.perf_counter() - comienzo)
+                conteos["con_descuento" if pedido.total < total else "promocion_no_elegible"] += 1
+        segundos = time.perf_counter() - inicio
+        pico = None
+        if medir_memoria:
+            pico = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+        return segundos, latencias, conteos, pico
     
-    def descontar_ingredientes(self, ingredientes_requeridos):
-        for ing, cant in ingredientes_requeridos.items():
-            self.ingredientes[ing] -= cant
+    segundos, latencias, conteos, _ = correr(False)
+    _, _, conteos_memoria, pico = correr(True)
+    # Misma semilla, mismos resultados: si no coinciden, la carga dejó de ser reproducible
+    if conteos != conteos_memoria:
+        raise RuntimeError("La carga no es reproducible: dos corridas con la misma semilla dieron resultados distintos")
+    return {
+        "semilla": semilla,
+        "pedidos": pedidos,
+        "clientes": clientes,
+        "python": sys.version.split()[0],
+        "segundos": segundos,
+        "pedidos_por_segundo": pedidos / segundos,
+        "latencias_ms": {operacion: {"p50": histograma.percentil(50) * 1000, "p90": histograma.percentil(90) * 1000,
+                                     "p99": histograma.percentil(99) * 1000, "max": histograma.maximo * 1000,
+                                     "cantidad": histograma.cantidad}
+                         for operacion, histograma in latencias.items()},
+        "resultados": dict(conteos),
+        "pico_memoria_mb": pico
+    }
 
-class Pedido:
-    def __init__(self, productos):
-        self.productos = productos
-        self.estado = "Pendiente"
+def comparar_con_base(resultado, base, tolerancia=0.25):
+    # Devuelve las regresiones de resultado respecto de una corrida anterior guardada como JSON.
+    # Las cubetas del histograma tienen un 12,5% de ancho: una tolerancia menor marcaría simple ruido
+    regresiones = []
+    if (resultado["semilla"], resultado["pedidos"], resultado["clientes"]) != \
+            (base["semilla"], base["pedidos"], base["clientes"]):
+        return ["La base se generó con otra semilla o tamaño de carga: no son comparables"]
+    if resultado["resultados"] != base["resultados"]:
+        regresiones.append(f"Los resultados cambiaron: {base['resultados']} -> {resultado['resultados']}")
+    if resultado["pedidos_por_segundo"] < base["pedidos_por_segundo"] * (1 - tolerancia):
+        regresiones.append(f"Rendimiento: {base['pedidos_por_segundo']:.0f} -> "
+                           f"{resultado['pedidos_por_segundo']:.0f} pedidos/s")
+    for operacion, latencia in resultado["latencias_ms"].items():
+        anterior = base["latencias_ms"].get(operacion)
+        if anterior and latencia["p99"] > anterior["p99"] * (1 + tolerancia):
+            regresiones.append(f"p99 de {operacion}: {anterior['p99']:.3f} -> {latencia['p99']:.3f} ms")
+    if resultado["pico_memoria_mb"] > base["pico_memoria_mb"] * (1 + tolerancia):
+        regresiones.append(f"Memoria: {base['pico_memoria_mb']:.1f} -> {resultado['pico_memoria_mb']:.1f} MB")
+    return regresiones
+
+def medir_lotes(pedidos=20000, tamaño_lote=200, semilla=0):
+    # Los mismos pedidos de dos maneras: uno por uno con realizar_pedido y en lotes con procesar_pedidos_en_lote.
+    # Hay stock para todos, así que los dos caminos tienen que terminar con el mismo inventario
+    productos = CafeteriaService().productos
+    aleatorio = random.Random(semilla)
+    clientes = [Cliente(f"Cliente {i + 1}", id=i + 1) for i in range(100)]
+    cargas = [(aleatorio.choice(clientes), aleatorio.choices(productos, k=aleatorio.randint(1, 4)))
+              for _ in range(pedidos)]
+    demanda = Counter()
+    for _, elegidos in cargas:
+        demanda.update(Pedido(elegidos).calcular_ingredientes())
     
-    def calcular_total(self):
-        return sum(producto.precio for producto in self.productos)
+    def inventario_lleno():
+        inventario = Inventario()
+        inventario.ingredientes = {ing: cant + 1 for ing, cant in demanda.items()}
+        return inventario
     
-    def validar_pedido(self, inventario):
-        ingredientes_necesarios = {}
-        for producto in self.productos:
-            if isinstance(producto, Bebida):
-                for opcion in producto.opciones_personalizadas:
-                    ingredientes_necesarios[opcion] = ingredientes_necesarios.get(opcion, 0) + 1
-        return inventario.verificar_disponibilidad(ingredientes_necesarios)
+    inventario_suelto = inventario_lleno()
+    solicitudes = [(cliente, Pedido(elegidos)) for cliente, elegidos in cargas]
+    inicio = time.perf_counter()
+    for cliente, pedido in solicitudes:
+        cliente.realizar_pedido(pedido, inventario_suelto)
+    uno_por_uno = time.perf_counter() - inicio
     
-    def procesar_pedido(self, inventario):
-        ingredientes_necesarios = {}
-        for producto in self.productos:
-            if isinstance(producto, Bebida):
-                for opcion in producto.opciones_personalizadas:
-                    ingredientes_necesarios[opcion] = ingredientes_necesarios.get(opcion, 0) + 1
-        inventario.descontar_ingredientes(ingredientes_necesarios)
-        self.estado = "En preparación"
+    inventario_lotes = inventario_lleno()
+    solicitudes = [(cliente, Pedido(elegidos)) for cliente, elegidos in cargas]
+    inicio = time.perf_counter()
+    for desde in range(0, pedidos, tamaño_lote):
+        procesar_pedidos_en_lote(solicitudes[desde:desde + tamaño_lote], inventario_lotes)
+    en_lotes = time.perf_counter() - inicio
+    return {
+        "pedidos": pedidos,
+        "tamaño_lote": tamaño_lote,
+        "uno_por_uno_pedidos_por_segundo": pedidos / uno_por_uno,
+        "en_lotes_pedidos_por_segundo": pedidos / en_lotes,
+        "mismo_inventario": {ing: round(cant, 6) for ing, cant in inventario_suelto.ingredientes.items()} ==
+                            {ing: round(cant, 6) for ing, cant in inventario_lotes.ingredientes.items()}
+    }
 
-class Promocion:
-    def __init__(self, codigo, descuento, clientes_frecuentes):
-        self.codigo = codigo
-        self.descuento = descuento
-        self.clientes_frecuentes = clientes_frecuentes
+def medir_escritura(pedidos=5000, carpeta=None):
+    # Guarda los mismos pedidos en una base nueva con escritura directa (una transacción por pedido) y con la
+    # cola de escritura diferida. La latencia es la que ve quien llama a guardar_pedido
+    carpeta = carpeta or tempfile.mkdtemp()
+    base = CafeteriaService()
+    cliente = base.clientes[0]
+    resultados = {"pedidos": pedidos}
+    for nombre, diferida in (("directa", False), ("diferida", True)):
+        ruta = os.path.join(carpeta, f"escritura_{nombre}.db")
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(ruta + sufijo):
+                os.remove(ruta + sufijo)
+        repositorio = RepositorioSQLite(ruta, escritura_diferida=diferida)
+        repositorio.guardar_todo(base.clientes, base.productos, base.empleados, base.promociones, base.inventario)
+        repositorio.esperar_escrituras()
+        transacciones_iniciales = repositorio.transacciones
+        latencias = Histograma()
+        inicio = time.perf_counter()
+        for i in range(pedidos):
+            pedido = Pedido([base.productos[i % len(base.productos)]])
+            pedido.fecha = time.time()
+            pedido.total = pedido.calcular_total()
+            comienzo = time.perf_counter()
+            repositorio.guardar_pedido(cliente, pedido, base.inventario)
+            latencias.registrar(time.perf_counter() - comienzo)
+        repositorio.esperar_escrituras()
+        segundos = time.perf_counter() - inicio
+        transacciones = repositorio.transacciones - transacciones_iniciales
+        repositorio.cerrar()
+        resultados[nombre] = {
+            "pedidos_por_segundo": pedidos / segundos,
+            "transacciones": transacciones,
+            "transacciones_por_segundo": transacciones / segundos,
+            "latencia_p50_ms": latencias.percentil(50) * 1000,
+            "latencia_p99_ms": latencias.percentil(99) * 1000
+        }
+    return resultados
+
+def medir_instantanea(clientes=100_000, pedidos=1_000_000, carpeta=None, semilla=0):
+    # Arranque en frío con el mismo estado guardado de tres formas: instantánea binaria (se mapea y los
+    # historiales se leen al usarlos), pickle y JSON (se leen y se rearman enteros). En los tres casos se
+    # cuenta hasta tener los objetos y haber leído el historial de un cliente, como al abrir la interfaz
+    carpeta = carpeta or tempfile.mkdtemp()
+    aleatorio = random.Random(semilla)
+    servicio = CafeteriaService()
+    servicio.clientes = [Cliente(f"Cliente {i + 1}", id=i + 1) for i in range(clientes)]
+    servicio.clientes_por_id = {cliente.id: cliente for cliente in servicio.clientes}
+    ahora = time.time()
+    for i in range(pedidos):
+        pedido = Pedido(aleatorio.choices(servicio.productos, k=aleatorio.randint(1, 3)))
+        pedido.estado = EstadoPedido.ENTREGADO
+        pedido.fecha = ahora - (pedidos - i)
+        pedido.total = pedido.calcular_total()
+        aleatorio.choice(servicio.clientes).historial_pedidos.append(pedido)
+    consultado = servicio.clientes[clientes // 2].id
+    resultados = {"clientes": clientes, "pedidos": pedidos}
     
-    def aplicar_descuento(self, cliente, total):
-        if cliente in self.clientes_frecuentes:
-            return total * (1 - self.descuento / 100)
-        return total
+    ruta = os.path.join(carpeta, "estado.snap")
+    inicio = time.perf_counter()
+    Instantanea.guardar(servicio, ruta)
+    guardado = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    instantanea = Instantanea(ruta)
+    datos = instantanea.cargar()
+    len(list(datos["clientes"][clientes // 2].historial_pedidos))
+    carga = time.perf_counter() - inicio
+    instantanea.cerrar()
+    resultados["instantanea"] = {"guardar_s": guardado, "cargar_s": carga, "bytes": os.path.getsize(ruta)}
+    
+    indice_producto = {id(producto): i for i, producto in enumerate(servicio.productos)}
+    ruta = os.path.join(carpeta, "estado.pickle")
+    inicio = time.perf_counter()
+    with open(ruta, "wb") as archivo:
+        pickle.dump({"clientes": servicio.clientes, "productos": servicio.productos, "empleados": servicio.empleados,
+                     "promociones": servicio.promociones, "inventario": servicio.inventario.ingredientes},
+                    archivo, protocol=pickle.HIGHEST_PROTOCOL)
+    guardado = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    with open(ruta, "rb") as archivo:
+        datos = pickle.load(archivo)
+    len({cliente.id: cliente for cliente in datos["clientes"]}[consultado].historial_pedidos)
+    carga = time.perf_counter() - inicio
+    resultados["pickle"] = {"guardar_s": guardado, "cargar_s": carga, "bytes": os.path.getsize(ruta)}
+    
+    ruta = os.path.join(carpeta, "estado.json")
+    inicio = time.perf_counter()
+    with open(ruta, "w", encoding="utf-8") as archivo:
+        json.dump({"clientes": [[cliente.id, cliente.nombre,
+                                 [[pedido.estado.value, pedido.fecha, pedido.total, list(pedido.promociones),
+                                   [indice_producto[id(producto)] for producto in pedido.productos]]
+                                  for pedido in cliente.historial_pedidos]]
+                                for cliente in servicio.clientes]}, archivo)
+    guardado = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    with open(ruta, encoding="utf-8") as archivo:
+        datos = json.load(archivo)
+    rearmados = []
+    for id_cliente, nombre, historial in datos["clientes"]:
+        cliente = Cliente(nombre, id_cliente)
+        for estado, fecha, total, codigos, indices in historial:
+            pedido = Pedido([servicio.productos[i] for i in indices])
+            pedido.estado = EstadoPedido(estado)
+            pedido.fecha = fecha
+            pedido.total = total
+            pedido.promociones = tuple(codigos)
+            cliente.historial_pedidos.append(pedido)
+        rearmados.append(cliente)
+    len({cliente.id: cliente for cliente in rearmados}[consultado].historial_pedidos)
+    carga = time.perf_counter() - inicio
+    resultados["json"] = {"guardar_s": guardado, "cargar_s": carga, "bytes": os.path.getsize(ruta)}
+    return resultados
 
-class CoffeeShopGUI:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("Sistema de Gestión de Cafetería")
-        self.root.geometry("1000x700")
+def medir_concurrencia(hilos_maximos=16, ventas_por_hilo=2000, rondas=200, semilla=0):
+    # Prueba de estrés: hilos_maximos cajas arrancan juntas y venden "leche de almendra" hasta agotarla; en cada
+    # ronda hay menos unidades que cajas, así que compiten por la última. Nunca puede venderse de más.
+    # Escalado: cada caja vende recetas al azar de 64 ingredientes, con candado por ingrediente y, como
+    # referencia, con un solo candado para todo el inventario. Con el GIL de CPython las dos variantes rinden
+    # parecido; la diferencia aparece cuando las cajas esperan con el candado tomado
+    unidades = max(1, hilos_maximos // 2)
+    rondas_incorrectas = 0
+    for _ in range(rondas):
+        inventario = Inventario()
+        inventario.ingredientes["leche de almendra"] = unidades
+        barrera = threading.Barrier(hilos_maximos)
+        vendidas = []
+        
+        def caja():
+            barrera.wait()
+            cantidad = 0
+            while inventario.reservar({"leche de almendra": 1}):
+                cantidad += 1
+            vendidas.append(cantidad)
         
-        # Datos iniciales
+        hilos = [threading.Thread(target=caja) for _ in range(hilos_maximos)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        if sum(vendidas) != unidades or inventario.ingredientes["leche de almendra"] != 0:
+            rondas_incorrectas += 1
+    
+    aleatorio = random.Random(semilla)
+    ingredientes = [f"ingrediente {i}" for i in range(64)]
+    recetas = [dict.fromkeys(aleatorio.sample(ingredientes, 3), 1) for _ in range(256)]
+    escalado = []
+    stock_consistente = True
+    cantidad_hilos = 1
+    while cantidad_hilos <= hilos_maximos:
+        fila = {"hilos": cantidad_hilos}
+        for variante in ("por_ingrediente", "candado_global"):
+            inventario = Inventario()
+            stock_inicial = cantidad_hilos * ventas_por_hilo * 3
+            inventario.ingredientes = dict.fromkeys(ingredientes, stock_inicial)
+            if variante == "candado_global":
+                candado = threading.RLock()
+                inventario._candado = lambda ingrediente: candado
+            pedidos_por_hilo = [[aleatorio.choice(recetas) for _ in range(ventas_por_hilo)]
+                                for _ in range(cantidad_hilos)]
+            consumo = Counter()
+            for pedidos in pedidos_por_hilo:
+                for receta in pedidos:
+                    consumo.update(receta)
+            
+            def vender(pedidos):
+                for receta in pedidos:
+                    inventario.reservar(receta)
+            
+            hilos = [threading.Thread(target=vender, args=(pedidos,)) for pedidos in pedidos_por_hilo]
+            inicio = time.perf_counter()
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+            fila[variante] = cantidad_hilos * ventas_por_hilo / (time.perf_counter() - inicio)
+            # Hay stock para todo: lo que queda tiene que ser exactamente el inicial menos lo vendido
+            stock_consistente = stock_consistente and all(
+                inventario.ingredientes[ing] == stock_inicial - consumo[ing] for ing in ingredientes)
+        escalado.append(fila)
+        cantidad_hilos *= 2
+    return {
+        "hilos": hilos_maximos,
+        "unidades": unidades,
+        "rondas": rondas,
+        "rondas_incorrectas": rondas_incorrectas,
+        "escalado": escalado,
+        "stock_consistente": stock_consistente
+    }
+
+class CafeteriaService:
+    # Núcleo sin interfaz gráfica: lo usan la GUI y el servidor asyncio
+    def __init__(self, repositorio=None, impuestos=()):
+        self.repositorio = repositorio if repositorio is not None else Repositorio()
+        self.motor_precios = MotorPrecios(impuestos)
         self.inventario = Inventario()
         self.clientes = []
         self.empleados = []
         self.productos = []
         self.promociones = []
-        self.carrito = []
-        self.cliente_actual = None
+        self.carritos = {}
+        self.derivados = None
+        # evento ("cliente_agregado", "empleado_agregado", "promocion_agregada") -> funciones a llamar con
+        # el objeto nuevo. Las importaciones masivas no avisan fila por fila: se refresca la lista al terminar
+        self.observadores = {}
         
         self.inicializar_datos()
+        self.clientes_por_id = {cliente.id: cliente for cliente in self.clientes}
+        self.indice_promociones = IndicePromociones(self.promociones)
+        self.indice_catalogo = IndiceCatalogo(self.productos)
+        self.cola_produccion = ColaProduccion([empleado for empleado in self.empleados
+                                               if empleado.rol == RolEmpleado.BARISTA])
+        self.cola_produccion.al_cambiar = self.repositorio.guardar_estado_pedido
+        self.restaurar_produccion()
         
-        # Crear pestañas
-        self.notebook = ttk.Notebook(root)
-        
-        # Pestañas
-        self.crear_tab_clientes()
-        self.crear_tab_productos()
-        self.crear_tab_inventario()
-        self.crear_tab_empleados()
-        self.crear_tab_promociones()
-        
-        self.notebook.pack(expand=True, fill='both')
-        
-        # Consola de salida
-        self.console_frame = ttk.LabelFrame(root, text="Consola")
-        self.console_frame.pack(fill='both', expand=True, padx=10, pady=5)
+        self.estadisticas = Estadisticas()
+        self.pronostico = PronosticoStock(self.inventario)
+        if self.derivados and self.estadisticas.importar(self.derivados["estadisticas"]):
+            # Una instantánea ya trae los agregados: no hace falta leer el historial
+            self.pronostico.importar(self.derivados["pronostico"])
+            return
         
-        self.console = tk.Text(self.console_frame, height=10)
-        self.console.pack(fill='both', expand=True, padx=5, pady=5)
+        for cliente in self.clientes:
+            for pedido in cliente.historial_pedidos:
+                self.estadisticas.registrar(cliente, pedido)
         
-        # Configurar estilo
-        self.style = ttk.Style()
-        self.style.configure('TButton', padding=5)
-        self.style.configure('TLabel', padding=5)
+        # El pronóstico se arma repitiendo el historial en orden cronológico
+        pedidos_fechados = [pedido for cliente in self.clientes for pedido in cliente.historial_pedidos
+                            if pedido.fecha is not None]
+        pedidos_fechados.sort(key=lambda pedido: pedido.fecha)
+        for pedido in pedidos_fechados:
+            self.pronostico.registrar(pedido.calcular_ingredientes(), pedido.fecha)
     
-    def log(self, mensaje):
-        self.console.insert(tk.END, mensaje + "\n")
-        self.console.see(tk.END)
+    def restaurar_produccion(self):
+        # Los pedidos que quedaron sin entregar vuelven a la cola de producción. La instantánea los trae
+        # anotados; si no, se buscan en los historiales
+        if self.derivados:
+            sin_entregar = []
+            for cliente_id, pedido_id in self.derivados["en_curso"]:
+                cliente = self.clientes_por_id[cliente_id]
+                sin_entregar += [(cliente, pedido) for pedido in cliente.historial_pedidos if pedido.id == pedido_id]
+        else:
+            sin_entregar = [(cliente, pedido) for cliente in self.clientes for pedido in cliente.historial_pedidos
+                            if pedido.estado != EstadoPedido.ENTREGADO]
+            sin_entregar.sort(key=lambda par: par[1].id)
+        for cliente, pedido in sin_entregar:
+            self.cola_produccion.restaurar(cliente, pedido)
     
     def inicializar_datos(self):
+        # Datos guardados de una sesión anterior
+        datos = self.repositorio.cargar()
+        if datos:
+            self.clientes = datos["clientes"]
+            self.productos = datos["productos"]
+            self.empleados = datos["empleados"]
+            self.promociones = datos["promociones"]
+            self.inventario = datos["inventario"]
+            self.derivados = datos.get("derivados")
+            return
+        
         # Inventario inicial
         ingredientes_iniciales = [
             ("leche de almendra", 10),
@@ -159,13 +2630,24 @@ class CoffeeShopGUI:
         for ing, cant in ingredientes_iniciales:
             self.inventario.actualizar_stock(ing, cant)
         
+        # Recetas: el shot de espresso es una sub-receta compartida
+        espresso = Receta("Shot de espresso", {"café": 1})
+        latte = {
+            "Mediano": Receta("Latte mediano", {espresso: 1, "leche": 0.75}),
+            "Grande": Receta("Latte grande", {espresso: 1, "leche": 1})
+        }
+        almendra = {
+            "Mediano": Receta("Almendra mediano", {espresso: 1, "leche de almendra": 0.75}),
+            "Grande": Receta("Almendra grande", {espresso: 1, "leche de almendra": 1})
+        }
+        
         # Productos iniciales
         self.productos = [
-            Bebida("Café Americano", 30, "Mediano", "Caliente", ["café"]),
-            Bebida("Café Latte", 50, "Grande", "Caliente", ["café", "leche"]),
-            Bebida("Café con Leche de Almendra", 60, "Grande", "Caliente", ["café", "leche de almendra"]),
-            Postre("Brownie", 40, False, False),
-            Postre("Muffin de Arándanos", 35, True, True)
+            Bebida("Café Americano", 30, "Mediano", "Caliente", ["café"], Receta("Americano", {espresso: 1})),
+            Bebida("Café Latte", 50, "Grande", "Caliente", ["café", "leche"], latte),
+            Bebida("Café con Leche de Almendra", 60, "Grande", "Caliente", ["café", "leche de almendra"], almendra),
+            Postre("Brownie", 40, False, False, Receta("Brownie", {"chocolate": 0.5, "azúcar": 0.25})),
+            Postre("Muffin de Arándanos", 35, True, True, Receta("Muffin", {"azúcar": 0.25}))
         ]
         
         # Cliente de ejemplo
@@ -179,10 +2661,858 @@ class CoffeeShopGUI:
         # Promoción de ejemplo
         promocion1 = Promocion("FIDELIDAD20", 20, [cliente1])
         self.promociones.append(promocion1)
+        
+        self.repositorio.guardar_todo(self.clientes, self.productos, self.empleados,
+                                      self.promociones, self.inventario)
+    
+    def cerrar(self):
+        self.repositorio.guardar_estado(self)
+        self.repositorio.cerrar()
+    
+    def carrito(self, sesion):
+        carrito = self.carritos.get(sesion)
+        if carrito is None:
+            carrito = self.carritos[sesion] = Carrito()
+        return carrito
+    
+    def suscribir(self, evento, observador):
+        self.observadores.setdefault(evento, []).append(observador)
+    
+    def _notificar(self, evento, objeto):
+        for observador in self.observadores.get(evento, []):
+            observador(objeto)
+    
+    def agregar_cliente(self, nombre):
+        cliente = Cliente(nombre)
+        self.clientes.append(cliente)
+        self.clientes_por_id[cliente.id] = cliente
+        self.repositorio.guardar_cliente(cliente)
+        self._notificar("cliente_agregado", cliente)
+        return cliente
+    
+    def agregar_empleado(self, nombre, rol):
+        empleado = Empleado(nombre, rol)
+        self.empleados.append(empleado)
+        self.repositorio.guardar_empleado(empleado)
+        if rol == RolEmpleado.BARISTA:
+            self.cola_produccion.agregar_barista(empleado)
+        self._notificar("empleado_agregado", empleado)
+        return empleado
+    
+    def agregar_promocion(self, codigo, descuento):
+        promocion = Promocion(codigo, descuento, [])
+        if not self.indice_promociones.agregar(promocion):
+            return None
+        self.promociones.append(promocion)
+        self.repositorio.guardar_promocion(promocion)
+        self._notificar("promocion_agregada", promocion)
+        return promocion
+    
+    def actualizar_stock(self, ingrediente, cantidad):
+        mensaje = self.inventario.actualizar_stock(ingrediente, cantidad)
+        self.repositorio.guardar_stock(self.inventario, [ingrediente])
+        return mensaje
+    
+    # Importación y exportación masiva. Las filas se validan una por una y se aplican por lotes:
+    # cada lote es una sola escritura en el repositorio
+    VALIDADORES_IMPORTACION = {
+        "clientes": validar_cliente,
+        "productos": validar_producto,
+        "inventario": validar_stock,
+        "promociones": validar_promocion
+    }
+    
+    def importar(self, tipo, ruta, tamaño_lote=5000, max_errores=100):
+        # Devuelve (filas importadas, cantidad de errores, primeros errores como (línea, mensaje))
+        importadas = 0
+        errores = []
+        cantidad_errores = 0
+        for lote, invalidas in self.validar_importacion(tipo, ruta, tamaño_lote):
+            fallidas = self.aplicar_importacion(tipo, lote)
+            importadas += len(lote) - len(fallidas)
+            cantidad_errores += len(invalidas) + len(fallidas)
+            errores.extend((invalidas + fallidas)[:max_errores - len(errores)])
+        errores.sort()
+        return importadas, cantidad_errores, errores
+    
+    def validar_importacion(self, tipo, ruta, tamaño_lote=5000):
+        # Genera (filas válidas, errores) por lote. Solo lee el archivo y arma objetos nuevos: no toca el
+        # estado del servicio, así que puede correr en otro hilo mientras se sigue usando
+        validar = self.VALIDADORES_IMPORTACION[tipo]
+        lote = []
+        invalidas = []
+        for numero, fila in leer_filas(ruta):
+            try:
+                if not isinstance(fila, dict):
+                    raise ValueError("La fila no es un objeto JSON válido")
+                lote.append((numero, validar(fila)))
+            except ValueError as error:
+                invalidas.append((numero, str(error)))
+            if len(lote) >= tamaño_lote:
+                yield lote, invalidas
+                lote = []
+                invalidas = []
+        if lote or invalidas:
+            yield lote, invalidas
+    
+    def aplicar_importacion(self, tipo, lote):
+        # Incorpora un lote validado; devuelve las filas que no se pudieron aplicar. Debe llamarse desde el
+        # hilo que usa el servicio (en la interfaz, el de Tk)
+        aplicar = {
+            "clientes": self._importar_clientes,
+            "productos": self._importar_productos,
+            "inventario": self._importar_stock,
+            "promociones": self._importar_promociones
+        }[tipo]
+        fallidas = aplicar(lote) if lote else []
+        metricas.incrementar(f"importacion_{tipo}", len(lote) - len(fallidas))
+        return fallidas
+    
+    def _importar_clientes(self, lote):
+        guardados = []
+        maximo = 0
+        for _, (id, nombre) in lote:
+            cliente = self.clientes_por_id.get(id) if id is not None else None
+            if cliente is None:
+                cliente = Cliente(nombre, id)
+                self.clientes.append(cliente)
+                self.clientes_por_id[cliente.id] = cliente
+            else:
+                cliente.nombre = nombre
+            maximo = max(maximo, cliente.id)
+            guardados.append(cliente)
+        # Los próximos clientes creados a mano no deben chocar con los ids importados
+        siguiente = next(Cliente._siguiente_id)
+        Cliente._siguiente_id = itertools.count(max(siguiente, maximo + 1))
+        self.repositorio.guardar_lote(clientes=guardados)
+        return []
+    
+    def _importar_productos(self, lote):
+        por_nombre = {producto.nombre: producto for producto in self.productos}
+        guardados = []
+        nuevos = []
+        for _, (producto, con_ingredientes) in lote:
+            existente = por_nombre.get(producto.nombre)
+            if existente is None:
+                por_nombre[producto.nombre] = producto
+                self.productos.append(producto)
+                nuevos.append(producto)
+                guardados.append(producto)
+            else:
+                # Un producto existente conserva su identidad (carritos, historiales): solo cambia precio y receta.
+                # Los carritos abiertos mantienen el precio con que se agregó cada línea
+                existente.precio = producto.precio
+                if con_ingredientes:
+                    existente.ingredientes_requeridos = producto.ingredientes_requeridos
+                guardados.append(existente)
+        self.indice_catalogo.agregar_lote(nuevos)
+        self.repositorio.guardar_lote(productos=guardados)
+        return []
+    
+    def _importar_stock(self, lote):
+        cantidades = dict(datos for _, datos in lote)
+        self.inventario.fijar_stock(cantidades)
+        self.repositorio.guardar_lote(inventario=self.inventario, ingredientes=cantidades)
+        return []
+    
+    def _importar_promociones(self, lote):
+        fallidas = []
+        cambios = {}
+        for numero, (codigo, descuento, cliente_id) in lote:
+            promocion = self.indice_promociones.buscar(codigo)
+            if promocion is None:
+                if descuento is None:
+                    fallidas.append((numero, f"La promoción {codigo} no existe y no tiene descuento"))
+                    continue
+                promocion = Promocion(codigo, descuento, [])
+                self.indice_promociones.agregar(promocion)
+                self.promociones.append(promocion)
+            elif descuento is not None:
+                promocion.cambiar_descuento(descuento)
+            nuevos = cambios.setdefault(promocion, [])
+            if cliente_id is not None:
+                cliente = self.clientes_por_id.get(cliente_id)
+                if cliente is None:
+                    fallidas.append((numero, f"No existe el cliente {cliente_id}"))
+                elif not promocion.es_elegible(cliente):
+                    self.indice_promociones.agregar_cliente_frecuente(promocion, cliente)
+                    nuevos.append(cliente)
+        self.repositorio.guardar_lote(promociones=list(cambios.items()))
+        return fallidas
+    
+    def exportar(self, tipo, ruta):
+        filas = {
+            "clientes": ({"id": cliente.id, "nombre": cliente.nombre} for cliente in self.clientes),
+            "productos": self._filas_productos(),
+            "inventario": ({"ingrediente": ingrediente, "cantidad": cantidad}
+                           for ingrediente, cantidad in self.inventario.ingredientes.items()),
+            "promociones": self._filas_promociones()
+        }[tipo]
+        return escribir_filas(ruta, COLUMNAS_EXPORTACION[tipo], filas)
+    
+    def _filas_productos(self):
+        for producto in self.productos:
+            fila = {"nombre": producto.nombre, "precio": producto.precio,
+                    "ingredientes": producto.ingredientes_requeridos}
+            if isinstance(producto, Bebida):
+                fila.update(clase="Bebida", tamaño=producto.tamaño, tipo=producto.tipo,
+                            opciones=producto.opciones_personalizadas)
+            else:
+                fila.update(clase="Postre", vegano=producto.vegano, sin_gluten=producto.sin_gluten)
+            yield fila
+    
+    def _filas_promociones(self):
+        # Una fila por cliente frecuente; las promociones sin clientes van en una fila sin cliente_id
+        for promocion in self.promociones:
+            if not promocion.clientes_frecuentes:
+                yield {"codigo": promocion.codigo, "descuento": promocion.descuento, "cliente_id": None}
+            for cliente in promocion.clientes_frecuentes:
+                yield {"codigo": promocion.codigo, "descuento": promocion.descuento, "cliente_id": cliente.id}
+    
+    @metricas.medir("agregar_al_carrito")
+    def agregar_al_carrito(self, sesion, indice_producto):
+        producto = self.productos[indice_producto]
+        self.carrito(sesion).agregar(producto)
+        return producto
+    
+    def quitar_del_carrito(self, sesion, indice):
+        return self.carrito(sesion).quitar(indice)
+    
+    @metricas.medir("procesar_pedido")
+    def procesar_pedido(self, sesion, cliente):
+        carrito = self.carrito(sesion)
+        if not carrito.productos:
+            return False, "El carrito está vacío"
+        pedido = Pedido(carrito.productos.copy())
+        desglose = carrito.desglose(self.motor_precios, cliente)
+        pedido.total = desglose.total
+        pedido.promociones = tuple(codigo for codigo, _ in desglose.descuentos)
+        exito, mensaje = cliente.realizar_pedido(pedido, self.inventario)
+        if exito:
+            self.estadisticas.registrar(cliente, pedido)
+            self.repositorio.guardar_pedido(cliente, pedido, self.inventario)
+            carrito.vaciar()
+            metricas.incrementar("pedido_exitoso")
+            barista = self.cola_produccion.encolar(cliente, pedido)
+            if barista:
+                mensaje += f"\nEstado del pedido cambiado a: {pedido.estado.value} ({barista.nombre})"
+            else:
+                mensaje += "\nEn espera de un barista disponible"
+        else:
+            metricas.incrementar("stock_agotado")
+        return exito, mensaje
+    
+    @metricas.medir("procesar_lote")
+    def procesar_lote(self, pedidos, politica=PoliticaLote.PARCIAL):
+        # pedidos: lista de (cliente, pedido). El stock se reserva una vez para todo el lote; los confirmados se
+        # registran como un pedido suelto (estadísticas, base y cola de producción). Devuelve [(exito, mensaje), ...]
+        for cliente, pedido in pedidos:
+            if pedido.total is None:
+                pedido.total = self.motor_precios.desglosar(pedido.calcular_total(), cliente, ()).total
+        resultados = procesar_pedidos_en_lote(pedidos, self.inventario, politica)
+        confirmados = [par for par, (exito, _) in zip(pedidos, resultados) if exito]
+        for cliente, pedido in confirmados:
+            self.estadisticas.registrar(cliente, pedido)
+        self.repositorio.guardar_pedidos(confirmados, self.inventario)
+        for cliente, pedido in confirmados:
+            self.cola_produccion.encolar(cliente, pedido)
+        metricas.incrementar("pedido_exitoso", len(confirmados))
+        metricas.incrementar("stock_agotado", len(pedidos) - len(confirmados))
+        return resultados
+    
+    def marcar_listo(self, pedido):
+        self.cola_produccion.marcar_listo(pedido)
+    
+    def entregar_pedido(self, pedido):
+        self.cola_produccion.entregar(pedido)
+    
+    def desglose(self, sesion, cliente):
+        return self.carrito(sesion).desglose(self.motor_precios, cliente)
+    
+    @metricas.medir("aplicar_promocion")
+    def aplicar_promocion(self, sesion, cliente, codigo):
+        # Devuelve (resultado, promocion, total, total_con_descuento) con los totales en centavos; promocion es
+        # None si el código no existe. Las promociones válidas quedan en el carrito y se acumulan con las anteriores
+        carrito = self.carrito(sesion)
+        total = carrito.desglose(self.motor_precios, cliente).total
+        promocion = self.indice_promociones.buscar(codigo)
+        if promocion is None:
+            metricas.incrementar("promocion_invalida")
+            return ResultadoPromocion.INVALIDA, None, total, total
+        if not promocion.es_elegible(cliente):
+            metricas.incrementar("promocion_no_elegible")
+            return ResultadoPromocion.NO_ELEGIBLE, promocion, total, total
+        if promocion in carrito.promociones:
+            return ResultadoPromocion.YA_APLICADA, promocion, total, total
+        carrito.agregar_promocion(promocion)
+        total_con_descuento = carrito.desglose(self.motor_precios, cliente).total
+        metricas.incrementar("promocion_aplicada")
+        return ResultadoPromocion.APLICADA, promocion, total, total_con_descuento
+    
+    def promociones_aplicables(self, sesion, cliente):
+        # Las promociones del cliente que todavía no están en el carrito, de mayor a menor descuento, con el
+        # total que quedaría (en centavos). Solo recorre las promociones en las que participa el cliente
+        carrito = self.carrito(sesion)
+        total = carrito.desglose(self.motor_precios, cliente).total
+        return [(promocion, total_con_descuento)
+                for promocion, total_con_descuento in self.indice_promociones.evaluar(cliente, total)
+                if promocion not in carrito.promociones]
+    
+    def cerrar_sesion(self, sesion):
+        # Descarta el carrito de una sesión que terminó
+        self.carritos.pop(sesion, None)
+
+class ServidorCafeteria:
+    # Protocolo de líneas JSON: {"accion": "...", ...} -> {"ok": bool, ...}.
+    # Todas las conexiones se atienden en el mismo bucle de eventos y ninguna operación espera en medio,
+    # así que el servicio se llama directamente: el bucle ya ejecuta las solicitudes de a una
+    def __init__(self, servicio):
+        self.servicio = servicio
+        self._sesiones = itertools.count(1)
+    
+    async def iniciar(self, host="127.0.0.1", puerto=8765, ruta_socket=None):
+        if ruta_socket:
+            return await asyncio.start_unix_server(self.atender, path=ruta_socket)
+        return await asyncio.start_server(self.atender, host, puerto)
+    
+    async def atender(self, lector, escritor):
+        sesion_conexion = f"conexion-{next(self._sesiones)}"
+        try:
+            while True:
+                linea = await lector.readline()
+                if not linea:
+                    break
+                try:
+                    respuesta = self.ejecutar(json.loads(linea), sesion_conexion)
+                except (ValueError, KeyError, IndexError, TypeError) as error:
+                    # TypeError: campos con el tipo equivocado, como un índice de producto en texto
+                    respuesta = {"ok": False, "mensaje": f"Solicitud no válida: {error}"}
+                escritor.write(json.dumps(respuesta).encode() + b"\n")
+                await escritor.drain()
+        finally:
+            # El carrito propio de la conexión no sirve a nadie más; los de sesiones con nombre se conservan
+            self.servicio.cerrar_sesion(sesion_conexion)
+            escritor.close()
+    
+    def ejecutar(self, solicitud, sesion_conexion):
+        servicio = self.servicio
+        if not isinstance(solicitud, dict):
+            raise ValueError("se esperaba un objeto JSON")
+        accion = solicitud["accion"]
+        sesion = solicitud.get("sesion", sesion_conexion)
+        
+        if accion == "productos":
+            return {"ok": True, "productos": [{"nombre": p.nombre, "precio": p.precio} for p in servicio.productos]}
+        if accion == "agregar_al_carrito":
+            # Las listas de Python aceptan -1 y True como índices: desde la red solo vale un entero dentro de rango
+            indice = solicitud["producto"]
+            if not _indice_valido(indice, len(servicio.productos)):
+                raise ValueError(f"producto inexistente: {indice!r}")
+            producto = servicio.agregar_al_carrito(sesion, indice)
+            return {"ok": True, "producto": producto.nombre, "subtotal_centavos": servicio.carrito(sesion).subtotal}
+        if accion == "quitar_del_carrito":
+            indice = solicitud["indice"]
+            if not _indice_valido(indice, len(servicio.carrito(sesion).productos)):
+                raise ValueError(f"el carrito no tiene la línea {indice!r}")
+            producto = servicio.quitar_del_carrito(sesion, indice)
+            return {"ok": True, "producto": producto.nombre, "subtotal_centavos": servicio.carrito(sesion).subtotal}
+        if accion == "procesar_pedido":
+            cliente = servicio.clientes_por_id[solicitud["cliente"]]
+            exito, mensaje = servicio.procesar_pedido(sesion, cliente)
+            return {"ok": exito, "mensaje": mensaje}
+        if accion == "aplicar_promocion":
+            cliente = servicio.clientes_por_id[solicitud["cliente"]]
+            resultado, _, total, total_con_descuento = servicio.aplicar_promocion(sesion, cliente, solicitud["codigo"])
+            return {"ok": resultado != ResultadoPromocion.INVALIDA, "resultado": resultado.value,
+                    "total_centavos": total, "total_con_descuento_centavos": total_con_descuento}
+        if accion == "promociones_aplicables":
+            cliente = servicio.clientes_por_id[solicitud["cliente"]]
+            return {"ok": True, "promociones": [{"codigo": promocion.codigo, "total_con_descuento_centavos": total}
+                                                for promocion, total in servicio.promociones_aplicables(sesion, cliente)]}
+        if accion == "actualizar_stock":
+            mensaje = servicio.actualizar_stock(solicitud["ingrediente"], int(solicitud["cantidad"]))
+            return {"ok": True, "mensaje": mensaje}
+        return {"ok": False, "mensaje": f"Acción desconocida: {accion}"}
+
+def ejecutar_servidor(servicio, host="127.0.0.1", puerto=8765, ruta_socket=None):
+    async def principal():
+        servidor = await ServidorCafeteria(servicio).iniciar(host, puerto, ruta_socket)
+        async with servidor:
+            await servidor.serve_forever()
+    try:
+        asyncio.run(principal())
+    finally:
+        servicio.cerrar()
+
+def medir_servidor(conexiones=100, pedidos_por_conexion=20, semilla=0):
+    # Carga sobre el servidor real: cada conexión es un cliente asyncio que agrega uno a tres productos y
+    # confirma el pedido, esperando cada respuesta. Se mide la ida y vuelta de cada solicitud
+    servicio = CafeteriaService()
+    servicio.inventario.fijar_stock(dict.fromkeys(servicio.inventario.ingredientes, 10 ** 9))
+    clientes = [servicio.agregar_cliente(f"Cliente {i + 1}") for i in range(conexiones)]
+    aleatorio = random.Random(semilla)
+    cantidad_productos = len(servicio.productos)
+    guiones = [[[aleatorio.randrange(cantidad_productos) for _ in range(aleatorio.randint(1, 3))]
+                for _ in range(pedidos_por_conexion)] for _ in range(conexiones)]
+    latencias = {"agregar_al_carrito": Histograma(), "procesar_pedido": Histograma()}
+    fallidas = 0
+    
+    async def cliente(puerto, cliente_id, guion):
+        nonlocal fallidas
+        lector, escritor = await asyncio.open_connection("127.0.0.1", puerto)
+        solicitudes = []
+        for indices in guion:
+            solicitudes.extend({"accion": "agregar_al_carrito", "producto": indice} for indice in indices)
+            solicitudes.append({"accion": "procesar_pedido", "cliente": cliente_id})
+        for solicitud in solicitudes:
+            comienzo = time.perf_counter()
+            escritor.write(json.dumps(solicitud).encode() + b"\n")
+            await escritor.drain()
+            respuesta = json.loads(await lector.readline())
+            latencias[solicitud["accion"]].registrar(time.perf_counter() - comienzo)
+            if not respuesta["ok"]:
+                fallidas += 1
+        escritor.close()
+        await escritor.wait_closed()
+    
+    async def principal():
+        servidor = await ServidorCafeteria(servicio).iniciar(puerto=0)
+        puerto = servidor.sockets[0].getsockname()[1]
+        async with servidor:
+            inicio = time.perf_counter()
+            await asyncio.gather(*(cliente(puerto, c.id, guion) for c, guion in zip(clientes, guiones)))
+            return time.perf_counter() - inicio
+    
+    segundos = asyncio.run(principal())
+    servicio.cerrar()
+    solicitudes = sum(histograma.cantidad for histograma in latencias.values())
+    return {
+        "conexiones": conexiones,
+        "solicitudes": solicitudes,
+        "fallidas": fallidas,
+        "solicitudes_por_segundo": solicitudes / segundos,
+        "latencias_ms": {accion: {"p50": histograma.percentil(50) * 1000, "p99": histograma.percentil(99) * 1000,
+                                  "maximo": histograma.maximo * 1000}
+                         for accion, histograma in latencias.items()}
+    }
+
+class RespuestaTienda(Enum):
+    ATENDIDO = "atendido"
+    SIN_STOCK = "sin_stock"
+    CLIENTE_DESCONOCIDO = "cliente_desconocido"
+    PEDIDO_INVALIDO = "pedido_invalido"
+
+def ejecutar_tienda(nombre, productos, ingredientes, conexion):
+    # Proceso de una tienda: su inventario es un fragmento propio y nadie más lo toca
+    inventario = Inventario()
+    inventario.ingredientes.update(ingredientes)
+    # Réplica de solo lectura de clientes y promociones; la actualiza el enrutador
+    clientes = set()
+    promociones = {}
+    while True:
+        mensaje = conexion.recv()
+        if mensaje is None:
+            break
+        orden = mensaje[0]
+        if orden == "replicar":
+            _, clientes_nuevos, promociones_nuevas = mensaje
+            clientes.update(clientes_nuevos)
+            for codigo, descuento, ids_frecuentes in promociones_nuevas:
+                promociones[codigo] = (descuento, set(ids_frecuentes))
+        elif orden == "pedido":
+            _, cliente_id, indices, codigo = mensaje
+            if cliente_id not in clientes:
+                conexion.send((RespuestaTienda.CLIENTE_DESCONOCIDO.value, None))
+                continue
+            # Un índice fuera del catálogo no puede tumbar el proceso de la tienda
+            if not all(_indice_valido(i, len(productos)) for i in indices):
+                conexion.send((RespuestaTienda.PEDIDO_INVALIDO.value, None))
+                continue
+            pedido = Pedido(productos[i] for i in indices)
+            if not inventario.reservar(pedido.calcular_ingredientes()):
+                conexion.send((RespuestaTienda.SIN_STOCK.value, None))
+                continue
+            total = pedido.calcular_total()
+            if codigo in promociones and cliente_id in promociones[codigo][1]:
+                total -= porcentaje(total, promociones[codigo][0])
+            conexion.send((RespuestaTienda.ATENDIDO.value, total))
+        elif orden == "stock":
+            conexion.send(dict(inventario.ingredientes))
+        elif orden == "reabastecer":
+            conexion.send(inventario.actualizar_stock(mensaje[1], mensaje[2]))
+
+class TiendaRemota:
+    __slots__ = ("nombre", "ubicacion", "conexion", "proceso", "candado")
+    
+    def __init__(self, nombre, ubicacion, productos, ingredientes):
+        self.nombre = nombre
+        self.ubicacion = ubicacion
+        self.conexion, extremo = multiprocessing.Pipe()
+        self.proceso = multiprocessing.Process(target=ejecutar_tienda, name=f"tienda-{nombre}",
+                                               args=(nombre, productos, ingredientes, extremo), daemon=True)
+        self.proceso.start()
+        extremo.close()
+        # Un solo pedido en vuelo por tienda y por conexión
+        self.candado = threading.Lock()
+    
+    def enviar(self, mensaje):
+        with self.candado:
+            self.conexion.send(mensaje)
+    
+    def solicitar(self, mensaje):
+        with self.candado:
+            self.conexion.send(mensaje)
+            return self.conexion.recv()
+
+class RedTiendas:
+    # Enrutador: manda cada pedido a la tienda más cercana que pueda prepararlo
+    def __init__(self, tiendas, productos):
+        # tiendas: lista de (nombre, (x, y), ingredientes)
+        self.productos = list(productos)
+        self.tiendas = [TiendaRemota(nombre, ubicacion, self.productos, ingredientes)
+                        for nombre, ubicacion, ingredientes in tiendas]
+        self.por_nombre = {tienda.nombre: tienda for tienda in self.tiendas}
+    
+    def replicar(self, clientes=(), promociones=()):
+        # Los cambios se difunden a todas las tiendas; el orden de la conexión garantiza
+        # que llegan antes que cualquier pedido enviado después
+        mensaje = ("replicar", [cliente.id for cliente in clientes],
+                   [(promocion.codigo, promocion.descuento, list(promocion._ids_frecuentes))
+                    for promocion in promociones])
+        for tienda in self.tiendas:
+            tienda.enviar(mensaje)
+    
+    def replicar_servicio(self, servicio):
+        self.replicar(servicio.clientes, servicio.promociones)
+    
+    def tiendas_cercanas(self, ubicacion):
+        return sorted(self.tiendas, key=lambda tienda: math.dist(tienda.ubicacion, ubicacion))
+    
+    @metricas.medir("enrutar_pedido")
+    def enrutar(self, cliente, indices_productos, ubicacion, codigo=None):
+        # Devuelve (respuesta, nombre de la tienda, total en centavos); tienda y total son None si no se atendió.
+        # Por la conexión viaja el valor de la respuesta, que no depende de cómo se importó el módulo
+        indices_productos = list(indices_productos)
+        if not all(_indice_valido(i, len(self.productos)) for i in indices_productos):
+            return RespuestaTienda.PEDIDO_INVALIDO, None, None
+        for tienda in self.tiendas_cercanas(ubicacion):
+            valor, total = tienda.solicitar(("pedido", cliente.id, indices_productos, codigo))
+            respuesta = RespuestaTienda(valor)
+            if respuesta == RespuestaTienda.ATENDIDO:
+                metricas.incrementar("pedido_enrutado")
+                return respuesta, tienda.nombre, total
+            if respuesta in (RespuestaTienda.CLIENTE_DESCONOCIDO, RespuestaTienda.PEDIDO_INVALIDO):
+                # La réplica es la misma en todas las tiendas: no tiene sentido seguir probando
+                return respuesta, None, None
+            metricas.incrementar("tienda_sin_stock")
+        return RespuestaTienda.SIN_STOCK, None, None
+    
+    def stock(self, nombre_tienda):
+        return self.por_nombre[nombre_tienda].solicitar(("stock",))
+    
+    def actualizar_stock(self, nombre_tienda, ingrediente, cantidad):
+        return self.por_nombre[nombre_tienda].solicitar(("reabastecer", ingrediente, cantidad))
     
-    def crear_tab_clientes(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Clientes")
+    def cerrar(self):
+        for tienda in self.tiendas:
+            tienda.enviar(None)
+        for tienda in self.tiendas:
+            tienda.proceso.join()
+            tienda.conexion.close()
+
+def medir_red_tiendas(cantidad_tiendas, pedidos=2000, productos=None, semilla=0):
+    # Simula una ciudad de 10x10 km con tiendas y clientes al azar; cada tienda atiende en su núcleo
+    aleatorio = random.Random(semilla)
+    productos = productos or [Bebida("Café", 30, "Mediano", "Caliente", []), Postre("Galleta", 20, False, False)]
+    demanda = Pedido(productos).calcular_ingredientes()
+    # Cada tienda alcanza para una parte de los pedidos: las más solicitadas se agotan y el
+    # enrutador tiene que buscar la siguiente más cercana
+    stock = {ing: cant * math.ceil(pedidos / cantidad_tiendas) for ing, cant in demanda.items()}
+    red = RedTiendas([(f"Tienda {i + 1}", (aleatorio.uniform(0, 10), aleatorio.uniform(0, 10)), stock)
+                      for i in range(cantidad_tiendas)], productos)
+    clientes = [Cliente(f"Cliente {i + 1}", id=i + 1) for i in range(100)]
+    red.replicar(clientes)
+    solicitudes = [(aleatorio.choice(clientes), [aleatorio.randrange(len(productos))],
+                    (aleatorio.uniform(0, 10), aleatorio.uniform(0, 10))) for _ in range(pedidos)]
+    latencias = []
+    
+    def atender(solicitud):
+        inicio = time.perf_counter()
+        _, tienda, _ = red.enrutar(*solicitud)
+        latencias.append(time.perf_counter() - inicio)
+        return tienda
+    
+    inicio = time.perf_counter()
+    try:
+        # Dos hilos por tienda: el enrutador casi no trabaja, espera las respuestas, y así cada tienda
+        # tiene el siguiente pedido esperando mientras responde el anterior
+        with concurrent.futures.ThreadPoolExecutor(max_workers=cantidad_tiendas * 2) as hilos:
+            atendidas = Counter(hilos.map(atender, solicitudes))
+    finally:
+        red.cerrar()
+    segundos = time.perf_counter() - inicio
+    latencias.sort()
+    return {
+        "tiendas": cantidad_tiendas,
+        "pedidos": pedidos,
+        "pedidos_por_segundo": pedidos / segundos,
+        "latencia_p50": latencias[len(latencias) // 2],
+        "latencia_p99": latencias[int(len(latencias) * 0.99)],
+        "por_tienda": dict(atendidas)
+    }
+
+class RegistroArchivo:
+    # Escribe eventos como líneas JSON desde un hilo aparte, rotando el archivo por tamaño
+    def __init__(self, ruta, tamaño_maximo=5 * 1024 * 1024, copias=3):
+        self.ruta = ruta
+        self.tamaño_maximo = tamaño_maximo
+        self.copias = copias
+        self._cola = queue.Queue()
+        self._hilo = threading.Thread(target=self._escritor, daemon=True)
+        self._hilo.start()
+    
+    def escribir(self, evento, **campos):
+        campos["evento"] = evento
+        campos["fecha"] = time.time()
+        self._cola.put(campos)
+    
+    def _rotar(self):
+        for i in range(self.copias - 1, 0, -1):
+            if os.path.exists(f"{self.ruta}.{i}"):
+                os.replace(f"{self.ruta}.{i}", f"{self.ruta}.{i + 1}")
+        os.replace(self.ruta, f"{self.ruta}.1")
+    
+    def _escritor(self):
+        archivo = open(self.ruta, "a", encoding="utf-8")
+        terminar = False
+        while not terminar:
+            lote = [self._cola.get()]
+            while True:
+                try:
+                    lote.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            for campos in lote:
+                if campos is None:
+                    terminar = True
+                    continue
+                archivo.write(json.dumps(campos, ensure_ascii=False) + "\n")
+            archivo.flush()
+            if archivo.tell() >= self.tamaño_maximo:
+                archivo.close()
+                self._rotar()
+                archivo = open(self.ruta, "a", encoding="utf-8")
+        archivo.close()
+    
+    def cerrar(self):
+        self._cola.put(None)
+        self._hilo.join()
+
+class CoffeeShopGUI:
+    SESION = "gui"
+    TAMAÑO_PAGINA_HISTORIAL = 20
+    MAX_LINEAS_CONSOLA = 1000
+    TIPOS_ARCHIVO = [("CSV", "*.csv"), ("JSON por línea", "*.jsonl"), ("Todos los archivos", "*.*")]
+    
+    # Cada pestaña se arma la primera vez que se selecciona
+    PESTAÑAS = [("Clientes", "crear_tab_clientes"), ("Pedidos", "crear_tab_productos"),
+                ("Inventario", "crear_tab_inventario"), ("Empleados", "crear_tab_empleados"),
+                ("Promociones", "crear_tab_promociones"), ("Producción", "crear_tab_produccion")]
+    
+    def __init__(self, root, servicio=None, registro=None, crear_servicio=None, inicio=None):
+        self.root = root
+        self.root.title("Sistema de Gestión de Cafetería")
+        self.root.geometry("1000x700")
+        
+        self.servicio = None
+        self.cliente_actual = None
+        self.historial_mostrado = None
+        self.pagina_historial = 0
+        
+        # Los mensajes se acumulan y se muestran juntos en el siguiente ciclo de la interfaz
+        self.registro = registro
+        self.mensajes_pendientes = []
+        self.consola_programada = False
+        self.llamadas_pendientes = queue.Queue()
+        # Las importaciones se leen y validan de a una en otro hilo; los lotes se aplican en el de Tk
+        self.importaciones = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="importacion")
+        self.importacion = None
+        self.cancelar_importacion = threading.Event()
+        
+        # Tiempos de arranque en segundos, contados desde inicio (por defecto, desde que se importó el módulo)
+        self.inicio = inicio if inicio is not None else INICIO_PROGRAMA
+        self.tiempos_arranque = {"importacion": time.perf_counter() - self.inicio}
+        self.root.after_idle(self.marcar_primer_pintado)
+        self.root.bind_all("<ButtonPress>", self.marcar_primera_interaccion, "+")
+        self.root.bind_all("<KeyPress>", self.marcar_primera_interaccion, "+")
+        
+        self.root.protocol("WM_DELETE_WINDOW", self.cerrar)
+        
+        # Indicador de carga: se quita cuando el servicio está listo
+        self.frame_carga = ttk.Frame(root)
+        self.frame_carga.pack(fill='x', padx=10, pady=5)
+        ttk.Label(self.frame_carga, text="Cargando datos...").pack(side='left', padx=5)
+        self.barra_carga = ttk.Progressbar(self.frame_carga, mode='indeterminate')
+        self.barra_carga.pack(side='left', fill='x', expand=True, padx=5)
+        
+        # Crear pestañas
+        self.notebook = ttk.Notebook(root)
+        self.notebook.pack(expand=True, fill='both')
+        self.pestañas_pendientes = {}
+        self.pestañas_construidas = set()
+        
+        # Consola de salida
+        self.console_frame = ttk.LabelFrame(root, text="Consola")
+        self.console_frame.pack(fill='both', expand=True, padx=10, pady=5)
+        
+        self.console = tk.Text(self.console_frame, height=10)
+        self.console.pack(fill='both', expand=True, padx=5, pady=5)
+        
+        # Configurar estilo
+        self.style = ttk.Style()
+        self.style.configure('TButton', padding=5)
+        self.style.configure('TLabel', padding=5)
+        
+        # Los datos se cargan en otro hilo para que la ventana aparezca de inmediato
+        if servicio is not None or crear_servicio is None:
+            self.conectar_servicio(servicio if servicio is not None else CafeteriaService())
+        else:
+            self.barra_carga.start(15)
+            self.carga = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="carga")
+            self.carga_servicio = self.carga.submit(crear_servicio)
+            self.root.after(50, self.esperar_carga)
+    
+    def esperar_carga(self):
+        if not self.carga_servicio.done():
+            self.root.after(50, self.esperar_carga)
+            return
+        self.carga.shutdown(wait=False)
+        try:
+            servicio = self.carga_servicio.result()
+        except Exception as error:
+            messagebox.showerror("Error", f"No se pudieron cargar los datos: {error}")
+            self.root.destroy()
+            return
+        self.conectar_servicio(servicio)
+    
+    def conectar_servicio(self, servicio):
+        # Datos iniciales: la GUI es un cliente del servicio
+        self.servicio = servicio
+        self.inventario = self.servicio.inventario
+        self.clientes = self.servicio.clientes
+        self.empleados = self.servicio.empleados
+        self.productos = self.servicio.productos
+        self.promociones = self.servicio.promociones
+        self.carrito = self.servicio.carrito(self.SESION)
+        self.servicio.pronostico.al_alertar = self.en_hilo_principal(self.alerta_stock_bajo)
+        self.servicio.repositorio.suscribir_fallos(self.en_hilo_principal(self.fallo_escritura))
+        self.root.after(100, self.revisar_llamadas_pendientes)
+        
+        self.barra_carga.stop()
+        self.frame_carga.destroy()
+        
+        # Pestañas vacías; solo se arma la que se muestra
+        for texto, constructor in self.PESTAÑAS:
+            tab = ttk.Frame(self.notebook)
+            self.notebook.add(tab, text=texto)
+            self.pestañas_pendientes[str(tab)] = (tab, texto, getattr(self, constructor))
+        self.notebook.bind("<<NotebookTabChanged>>", self.construir_pestaña)
+        self.construir_pestaña()
+        
+        self.tiempos_arranque["datos_cargados"] = time.perf_counter() - self.inicio
+        self.informar_arranque()
+    
+    def en_hilo_principal(self, funcion):
+        # Los observadores del dominio pueden llamarse desde otros hilos (escritura, importaciones), que no
+        # pueden tocar la ventana: en ese caso la llamada queda en una cola que se atiende desde aquí
+        def llamar(*args):
+            if threading.current_thread() is threading.main_thread():
+                funcion(*args)
+            else:
+                self.llamadas_pendientes.put((funcion, args))
+        return llamar
+    
+    def revisar_llamadas_pendientes(self):
+        while True:
+            try:
+                funcion, args = self.llamadas_pendientes.get_nowait()
+            except queue.Empty:
+                break
+            funcion(*args)
+        self.root.after(100, self.revisar_llamadas_pendientes)
+    
+    def fallo_escritura(self, error, operaciones):
+        self.log(f"Error al guardar en la base de datos: {error} ({len(operaciones)} operaciones sin guardar)",
+                 "error_escritura", operaciones=len(operaciones))
+        messagebox.showerror("Error", f"No se pudieron guardar algunos cambios en la base de datos: {error}")
+    
+    def construir_pestaña(self, event=None):
+        pendiente = self.pestañas_pendientes.pop(str(self.notebook.select()), None)
+        if pendiente:
+            tab, texto, constructor = pendiente
+            constructor(tab)
+            self.pestañas_construidas.add(texto)
+    
+    def construida(self, texto):
+        return texto in self.pestañas_construidas
+    
+    def marcar_primer_pintado(self):
+        self.tiempos_arranque.setdefault("primer_pintado", time.perf_counter() - self.inicio)
+        self.informar_arranque()
+    
+    def marcar_primera_interaccion(self, event=None):
+        if "primera_interaccion" not in self.tiempos_arranque:
+            self.tiempos_arranque["primera_interaccion"] = time.perf_counter() - self.inicio
+            self.informar_arranque()
+    
+    def informar_arranque(self):
+        # Se informa cuando ya se conocen el primer pintado y la carga, y otra vez con la primera interacción
+        if "primer_pintado" not in self.tiempos_arranque or "datos_cargados" not in self.tiempos_arranque:
+            return
+        nombres = {"importacion": "importación", "primer_pintado": "primer pintado",
+                   "datos_cargados": "datos cargados", "primera_interaccion": "primera interacción"}
+        detalle = ", ".join(f"{nombres[clave]} {segundos * 1000:.0f} ms"
+                            for clave, segundos in self.tiempos_arranque.items())
+        self.log(f"Arranque: {detalle}", "arranque",
+                 **{clave: round(segundos, 4) for clave, segundos in self.tiempos_arranque.items()})
+    
+    def log(self, mensaje, evento="mensaje", **campos):
+        if self.registro:
+            self.registro.escribir(evento, mensaje=mensaje, **campos)
+        self.mensajes_pendientes.append(mensaje + "\n")
+        if not self.consola_programada:
+            self.consola_programada = True
+            self.root.after(50, self.vaciar_consola)
+    
+    def vaciar_consola(self):
+        self.consola_programada = False
+        texto = "".join(self.mensajes_pendientes)
+        self.mensajes_pendientes = []
+        self.console.insert(tk.END, texto)
+        
+        # Se descartan las líneas más antiguas para que el texto no crezca sin límite
+        lineas = int(self.console.index("end-1c").split(".")[0])
+        if lineas > self.MAX_LINEAS_CONSOLA:
+            self.console.delete("1.0", f"{lineas - self.MAX_LINEAS_CONSOLA + 1}.0")
+        self.console.see(tk.END)
+    
+    def cerrar(self):
+        if self.servicio is None:
+            # Se cerró durante la carga: se espera a que termine para cerrar la base como corresponde
+            try:
+                self.servicio = self.carga_servicio.result()
+            except Exception:
+                self.servicio = None
+        # La lectura de una importación en curso se abandona antes de cerrar la base
+        self.cancelar_importacion.set()
+        self.importaciones.shutdown(wait=True)
+        if self.servicio is not None:
+            self.servicio.cerrar()
+        if self.registro:
+            self.registro.cerrar()
+        self.root.destroy()
+    
+    def crear_tab_clientes(self, tab):
         
         # Lista de clientes
         frame_lista = ttk.LabelFrame(tab, text="Clientes Registrados")
@@ -191,6 +3521,7 @@ class CoffeeShopGUI:
         self.clientes_listbox = tk.Listbox(frame_lista)
         self.clientes_listbox.pack(fill='both', expand=True, padx=5, pady=5)
         self.actualizar_lista_clientes()
+        self.servicio.suscribir("cliente_agregado", self.en_hilo_principal(self.agregar_fila_cliente))
         
         # Botones
         frame_botones = ttk.Frame(tab)
@@ -202,15 +3533,39 @@ class CoffeeShopGUI:
                   command=self.seleccionar_cliente).pack(side='left', padx=5)
         ttk.Button(frame_botones, text="Ver Historial", 
                   command=self.ver_historial_cliente).pack(side='left', padx=5)
+        ttk.Button(frame_botones, text="Ver Estadísticas", 
+                  command=self.ver_estadisticas).pack(side='left', padx=5)
+        ttk.Button(frame_botones, text="Importar...", 
+                  command=lambda: self.importar_archivo("clientes")).pack(side='left', padx=5)
+        ttk.Button(frame_botones, text="Exportar...", 
+                  command=lambda: self.exportar_archivo("clientes")).pack(side='left', padx=5)
     
-    def crear_tab_productos(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Pedidos")
+    def crear_tab_productos(self, tab):
         
         # Frame superior - Productos disponibles
         frame_productos = ttk.LabelFrame(tab, text="Productos Disponibles")
         frame_productos.pack(fill='both', expand=True, padx=10, pady=5)
         
+        # Búsqueda y filtros del catálogo
+        frame_busqueda = ttk.Frame(frame_productos)
+        frame_busqueda.pack(fill='x', padx=5, pady=5)
+        
+        ttk.Label(frame_busqueda, text="Buscar:").pack(side='left')
+        self.busqueda_var = tk.StringVar()
+        self.busqueda_var.trace_add("write", lambda *args: self.actualizar_lista_productos())
+        ttk.Entry(frame_busqueda, textvariable=self.busqueda_var).pack(side='left', fill='x', expand=True, padx=5)
+        
+        self.filtro_vegano_var = tk.BooleanVar()
+        ttk.Checkbutton(frame_busqueda, text="Vegano", variable=self.filtro_vegano_var,
+                       command=self.actualizar_lista_productos).pack(side='left', padx=5)
+        self.filtro_sin_gluten_var = tk.BooleanVar()
+        ttk.Checkbutton(frame_busqueda, text="Sin gluten", variable=self.filtro_sin_gluten_var,
+                       command=self.actualizar_lista_productos).pack(side='left', padx=5)
+        ttk.Button(frame_busqueda, text="Importar...", 
+                  command=lambda: self.importar_archivo("productos")).pack(side='left', padx=5)
+        ttk.Button(frame_busqueda, text="Exportar...", 
+                  command=lambda: self.exportar_archivo("productos")).pack(side='left', padx=5)
+        
         self.productos_listbox = tk.Listbox(frame_productos)
         self.productos_listbox.pack(fill='both', expand=True, padx=5, pady=5)
         self.actualizar_lista_productos()
@@ -220,7 +3575,8 @@ class CoffeeShopGUI:
         frame_carrito.pack(fill='both', expand=True, padx=10, pady=5)
         
         # Cliente seleccionado
-        self.cliente_label = ttk.Label(frame_carrito, text="Cliente: Ninguno seleccionado")
+        self.cliente_label = ttk.Label(frame_carrito, text=f"Cliente: {self.cliente_actual.nombre}"
+                                       if self.cliente_actual else "Cliente: Ninguno seleccionado")
         self.cliente_label.pack(anchor='w', padx=5, pady=5)
         
         # Lista del carrito
@@ -228,7 +3584,7 @@ class CoffeeShopGUI:
         self.carrito_listbox.pack(fill='both', expand=True, padx=5, pady=5)
         
         # Total
-        self.total_label = ttk.Label(frame_carrito, text="Total: $0")
+        self.total_label = ttk.Label(frame_carrito, text="Total: $0.00")
         self.total_label.pack(anchor='w', padx=5, pady=5)
         
         # Botones
@@ -244,9 +3600,7 @@ class CoffeeShopGUI:
         ttk.Button(frame_botones, text="Aplicar Promoción", 
                   command=self.aplicar_promocion).pack(side='left', padx=5)
     
-    def crear_tab_inventario(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Inventario")
+    def crear_tab_inventario(self, tab):
         
         # Lista de inventario
         frame_lista = ttk.LabelFrame(tab, text="Ingredientes en Stock")
@@ -255,6 +3609,7 @@ class CoffeeShopGUI:
         self.inventario_listbox = tk.Listbox(frame_lista)
         self.inventario_listbox.pack(fill='both', expand=True, padx=5, pady=5)
         self.actualizar_lista_inventario()
+        self.inventario.suscribir(self.en_hilo_principal(self.actualizar_filas_inventario))
         
         # Formulario para actualizar
         frame_form = ttk.LabelFrame(tab, text="Actualizar Inventario")
@@ -270,10 +3625,14 @@ class CoffeeShopGUI:
         
         ttk.Button(frame_form, text="Agregar/Actualizar", 
                   command=self.actualizar_inventario).grid(row=2, column=0, columnspan=2, pady=5)
+        ttk.Button(frame_form, text="Sugerencias de Reorden", 
+                  command=self.ver_sugerencias_reorden).grid(row=3, column=0, columnspan=2, pady=5)
+        ttk.Button(frame_form, text="Importar...", 
+                  command=lambda: self.importar_archivo("inventario")).grid(row=4, column=0, pady=5)
+        ttk.Button(frame_form, text="Exportar...", 
+                  command=lambda: self.exportar_archivo("inventario")).grid(row=4, column=1, pady=5)
     
-    def crear_tab_empleados(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Empleados")
+    def crear_tab_empleados(self, tab):
         
         # Lista de empleados
         frame_lista = ttk.LabelFrame(tab, text="Empleados Registrados")
@@ -282,6 +3641,7 @@ class CoffeeShopGUI:
         self.empleados_listbox = tk.Listbox(frame_lista)
         self.empleados_listbox.pack(fill='both', expand=True, padx=5, pady=5)
         self.actualizar_lista_empleados()
+        self.servicio.suscribir("empleado_agregado", self.en_hilo_principal(self.agregar_fila_empleado))
         
         # Formulario para agregar
         frame_form = ttk.LabelFrame(tab, text="Agregar Empleado")
@@ -300,9 +3660,7 @@ class CoffeeShopGUI:
         ttk.Button(frame_form, text="Agregar Empleado", 
                   command=self.agregar_empleado).grid(row=2, column=0, columnspan=2, pady=5)
     
-    def crear_tab_promociones(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Promociones")
+    def crear_tab_promociones(self, tab):
         
         # Lista de promociones
         frame_lista = ttk.LabelFrame(tab, text="Promociones Disponibles")
@@ -311,6 +3669,7 @@ class CoffeeShopGUI:
         self.promociones_listbox = tk.Listbox(frame_lista)
         self.promociones_listbox.pack(fill='both', expand=True, padx=5, pady=5)
         self.actualizar_lista_promociones()
+        self.servicio.suscribir("promocion_agregada", self.en_hilo_principal(self.agregar_fila_promocion))
         
         # Formulario para agregar
         frame_form = ttk.LabelFrame(tab, text="Crear Promoción")
@@ -326,62 +3685,141 @@ class CoffeeShopGUI:
         
         ttk.Button(frame_form, text="Agregar Promoción", 
                   command=self.agregar_promocion).grid(row=2, column=0, columnspan=2, pady=5)
+        ttk.Button(frame_form, text="Importar...", 
+                  command=lambda: self.importar_archivo("promociones")).grid(row=3, column=0, pady=5)
+        ttk.Button(frame_form, text="Exportar...", 
+                  command=lambda: self.exportar_archivo("promociones")).grid(row=3, column=1, pady=5)
+    
+    def crear_tab_produccion(self, tab):
+        
+        # Pedidos en cola o en preparación
+        frame_lista = ttk.LabelFrame(tab, text="Pedidos en Curso")
+        frame_lista.pack(fill='both', expand=True, padx=10, pady=5)
+        
+        self.produccion_listbox = tk.Listbox(frame_lista)
+        self.produccion_listbox.pack(fill='both', expand=True, padx=5, pady=5)
+        self.actualizar_lista_produccion()
+        
+        # Botones
+        frame_botones = ttk.Frame(tab)
+        frame_botones.pack(fill='x', padx=10, pady=5)
+        
+        ttk.Button(frame_botones, text="Marcar Listo", 
+                  command=self.marcar_pedido_listo).pack(side='left', padx=5)
+        ttk.Button(frame_botones, text="Entregar", 
+                  command=self.entregar_pedido).pack(side='left', padx=5)
+        ttk.Button(frame_botones, text="Ver Métricas", 
+                  command=self.ver_metricas_produccion).pack(side='left', padx=5)
     
     # Métodos para actualizar listas
+    @metricas.medir("actualizar_lista_clientes")
     def actualizar_lista_clientes(self):
         self.clientes_listbox.delete(0, tk.END)
-        for cliente in self.clientes:
-            self.clientes_listbox.insert(tk.END, cliente.nombre)
+        # Una sola llamada a Tk aunque haya miles de clientes
+        self.clientes_listbox.insert(tk.END, *[cliente.nombre for cliente in self.clientes])
+    
+    def agregar_fila_cliente(self, cliente):
+        self.clientes_listbox.insert(tk.END, cliente.nombre)
     
+    @metricas.medir("actualizar_lista_productos")
     def actualizar_lista_productos(self):
         self.productos_listbox.delete(0, tk.END)
-        for producto in self.productos:
+        # Índices en self.productos de lo que se muestra, en el mismo orden que la lista
+        self.productos_visibles = self.servicio.indice_catalogo.buscar(
+            self.busqueda_var.get(), self.filtro_vegano_var.get(), self.filtro_sin_gluten_var.get())
+        for indice in self.productos_visibles:
+            producto = self.productos[indice]
             if isinstance(producto, Bebida):
-                desc = f"{producto.nombre} - ${producto.precio} ({producto.tamaño}, {producto.tipo})"
+                desc = f"{producto.nombre} - {formatear_dinero(a_centavos(producto.precio))} ({producto.tamaño}, {producto.tipo})"
             else:
-                desc = f"{producto.nombre} - ${producto.precio}"
+                desc = f"{producto.nombre} - {formatear_dinero(a_centavos(producto.precio))}"
             self.productos_listbox.insert(tk.END, desc)
     
+    @metricas.medir("actualizar_lista_inventario")
     def actualizar_lista_inventario(self):
         self.inventario_listbox.delete(0, tk.END)
+        # Fila de cada ingrediente, para actualizar solo las que cambian
+        self.filas_inventario = {}
         for ingrediente, cantidad in self.inventario.ingredientes.items():
-            self.inventario_listbox.insert(tk.END, f"{ingrediente}: {cantidad} unidades")
+            self.filas_inventario[ingrediente] = self.inventario_listbox.size()
+            self.inventario_listbox.insert(tk.END, f"{ingrediente}: {formatear_cantidad(cantidad)} unidades")
+    
+    def actualizar_filas_inventario(self, ingredientes):
+        for ingrediente in ingredientes:
+            texto = f"{ingrediente}: {formatear_cantidad(self.inventario.ingredientes[ingrediente])} unidades"
+            fila = self.filas_inventario.get(ingrediente)
+            if fila is None:
+                self.filas_inventario[ingrediente] = self.inventario_listbox.size()
+                self.inventario_listbox.insert(tk.END, texto)
+            else:
+                self.inventario_listbox.delete(fila)
+                self.inventario_listbox.insert(fila, texto)
     
+    @metricas.medir("actualizar_lista_empleados")
     def actualizar_lista_empleados(self):
         self.empleados_listbox.delete(0, tk.END)
         for empleado in self.empleados:
-            self.empleados_listbox.insert(tk.END, f"{empleado.nombre} - {empleado.rol.value}")
+            self.agregar_fila_empleado(empleado)
+    
+    def agregar_fila_empleado(self, empleado):
+        self.empleados_listbox.insert(tk.END, f"{empleado.nombre} - {empleado.rol.value}")
     
+    @metricas.medir("actualizar_lista_promociones")
     def actualizar_lista_promociones(self):
         self.promociones_listbox.delete(0, tk.END)
         for promocion in self.promociones:
-            clientes = ", ".join([c.nombre for c in promocion.clientes_frecuentes])
-            self.promociones_listbox.insert(tk.END, 
-                                          f"{promocion.codigo}: {promocion.descuento}% - Clientes: {clientes}")
+            self.agregar_fila_promocion(promocion)
+    
+    def agregar_fila_promocion(self, promocion):
+        clientes = ", ".join([c.nombre for c in promocion.clientes_frecuentes])
+        self.promociones_listbox.insert(tk.END, 
+                                      f"{promocion.codigo}: {promocion.descuento}% - Clientes: {clientes}")
+    
+    @metricas.medir("actualizar_lista_produccion")
+    def actualizar_lista_produccion(self):
+        self.produccion_listbox.delete(0, tk.END)
+        self.pedidos_produccion = []
+        for cliente, pedido, barista in self.servicio.cola_produccion.activos():
+            self.pedidos_produccion.append(pedido)
+            asignado = barista.nombre if barista else "sin asignar"
+            self.produccion_listbox.insert(tk.END, f"{cliente.nombre} - {len(pedido.productos)} productos - "
+                                                   f"{pedido.estado.value} ({asignado})")
     
+    @metricas.medir("actualizar_carrito")
     def actualizar_carrito(self):
         self.carrito_listbox.delete(0, tk.END)
-        for producto in self.carrito:
-            self.carrito_listbox.insert(tk.END, f"{producto.nombre} - ${producto.precio}")
-        
-        total = sum(producto.precio for producto in self.carrito)
-        self.total_label.config(text=f"Total: ${total}")
+        for producto, centavos in zip(self.carrito.productos, self.carrito.centavos):
+            self.carrito_listbox.insert(tk.END, f"{producto.nombre} - {formatear_dinero(centavos)}")
+        self.actualizar_total_carrito()
+    
+    def actualizar_total_carrito(self):
+        # El desglose queda en caché en el carrito hasta el próximo cambio
+        desglose = self.servicio.desglose(self.SESION, self.cliente_actual)
+        lineas = []
+        if desglose.descuentos or desglose.impuestos:
+            lineas.append(f"Subtotal: {formatear_dinero(desglose.subtotal)}")
+        lineas += [f"{codigo}: -{formatear_dinero(monto)}" for codigo, monto in desglose.descuentos]
+        lineas += [f"{nombre}: {formatear_dinero(monto)}" for nombre, monto in desglose.impuestos]
+        lineas.append(f"Total: {formatear_dinero(desglose.total)}")
+        self.total_label.config(text="\n".join(lineas))
     
     # Métodos de funcionalidad
     def agregar_cliente(self):
         nombre = simpledialog.askstring("Nuevo Cliente", "Ingrese el nombre del cliente:")
         if nombre:
-            nuevo_cliente = Cliente(nombre)
-            self.clientes.append(nuevo_cliente)
-            self.actualizar_lista_clientes()
-            self.log(f"Cliente agregado: {nombre}")
+            nuevo_cliente = self.servicio.agregar_cliente(nombre)
+            self.log(f"Cliente agregado: {nombre}", "cliente_agregado", cliente=nuevo_cliente.id)
     
     def seleccionar_cliente(self):
         seleccion = self.clientes_listbox.curselection()
         if seleccion:
             self.cliente_actual = self.clientes[seleccion[0]]
-            self.cliente_label.config(text=f"Cliente: {self.cliente_actual.nombre}")
             self.log(f"Cliente seleccionado: {self.cliente_actual.nombre}")
+            # Si la pestaña de pedidos todavía no se armó, toma el cliente al construirse
+            if self.construida("Pedidos"):
+                self.cliente_label.config(text=f"Cliente: {self.cliente_actual.nombre}")
+                # Las promociones del carrito dependen del cliente
+                self.actualizar_total_carrito()
         else:
             messagebox.showwarning("Advertencia", "Seleccione un cliente de la lista")
     
@@ -390,33 +3828,52 @@ class CoffeeShopGUI:
             messagebox.showwarning("Advertencia", "Seleccione un cliente primero")
             return
         
-        historial = f"\nHistorial de pedidos de {self.cliente_actual.nombre}:\n"
-        if not self.cliente_actual.historial_pedidos:
-            historial += "No hay pedidos registrados"
+        lineas = [f"\nHistorial de pedidos de {self.cliente_actual.nombre}:"]
+        total_pedidos = len(self.cliente_actual.historial_pedidos)
+        if not total_pedidos:
+            lineas.append("No hay pedidos registrados")
         else:
-            for i, pedido in enumerate(self.cliente_actual.historial_pedidos):
-                historial += f"Pedido {i+1}: ${pedido.calcular_total()} - Estado: {pedido.estado}\n"
-                for producto in pedido.productos:
-                    historial += f"  - {producto.nombre}\n"
+            # Cada clic muestra una página más antigua, empezando por la más reciente
+            paginas = (total_pedidos + self.TAMAÑO_PAGINA_HISTORIAL - 1) // self.TAMAÑO_PAGINA_HISTORIAL
+            if self.historial_mostrado is not self.cliente_actual or self.pagina_historial <= 0:
+                self.historial_mostrado = self.cliente_actual
+                self.pagina_historial = paginas
+            inicio = (self.pagina_historial - 1) * self.TAMAÑO_PAGINA_HISTORIAL
+            lineas.append(f"Página {self.pagina_historial} de {paginas}")
+            lineas.extend(iterar_historial(self.cliente_actual, inicio, inicio + self.TAMAÑO_PAGINA_HISTORIAL))
+            self.pagina_historial -= 1
         
-        self.log(historial)
+        self.log("\n".join(lineas))
+    
+    def ver_estadisticas(self):
+        estadisticas = self.servicio.estadisticas
+        lineas = ["\nEstadísticas de ventas:",
+                  f"Pedidos: {estadisticas.total_pedidos} - "
+                  f"Ingresos: {formatear_dinero(estadisticas.ingresos_totales)}"]
+        for nombre, unidades in estadisticas.productos_mas_vendidos():
+            lineas.append(f"  - {nombre}: {unidades} vendidos, "
+                          f"{formatear_dinero(estadisticas.ingresos_por_producto[nombre])}")
+        for cliente_id, ingresos in estadisticas.mejores_clientes(3):
+            lineas.append(f"  Cliente {self.servicio.clientes_por_id[cliente_id].nombre}: {formatear_dinero(ingresos)}")
+        self.log("\n".join(lineas))
     
     def agregar_al_carrito(self):
         seleccion = self.productos_listbox.curselection()
         if seleccion:
-            producto = self.productos[seleccion[0]]
-            self.carrito.append(producto)
-            self.actualizar_carrito()
-            self.log(f"Producto agregado al carrito: {producto.nombre}")
+            producto = self.servicio.agregar_al_carrito(self.SESION, self.productos_visibles[seleccion[0]])
+            self.carrito_listbox.insert(tk.END, f"{producto.nombre} - {formatear_dinero(a_centavos(producto.precio))}")
+            self.actualizar_total_carrito()
+            self.log(f"Producto agregado al carrito: {producto.nombre}", "carrito_agregar", producto=producto.nombre)
         else:
             messagebox.showwarning("Advertencia", "Seleccione un producto de la lista")
     
     def quitar_del_carrito(self):
         seleccion = self.carrito_listbox.curselection()
         if seleccion:
-            producto = self.carrito.pop(seleccion[0])
-            self.actualizar_carrito()
-            self.log(f"Producto removido del carrito: {producto.nombre}")
+            producto = self.servicio.quitar_del_carrito(self.SESION, seleccion[0])
+            self.carrito_listbox.delete(seleccion[0])
+            self.actualizar_total_carrito()
+            self.log(f"Producto removido del carrito: {producto.nombre}", "carrito_quitar", producto=producto.nombre)
         else:
             messagebox.showwarning("Advertencia", "Seleccione un producto del carrito")
     
@@ -425,46 +3882,160 @@ class CoffeeShopGUI:
             messagebox.showwarning("Advertencia", "Seleccione un cliente primero")
             return
         
-        if not self.carrito:
+        if not self.carrito.productos:
             messagebox.showwarning("Advertencia", "El carrito está vacío")
             return
         
-        pedido = Pedido(self.carrito.copy())
-        exito, mensaje = self.cliente_actual.realizar_pedido(pedido, self.inventario)
+        inicio = time.perf_counter()
+        exito, mensaje = self.servicio.procesar_pedido(self.SESION, self.cliente_actual)
+        latencia = (time.perf_counter() - inicio) * 1000
         
-        self.log(mensaje)
+        self.log(mensaje, "pedido", cliente=self.cliente_actual.id, exito=exito,
+                 pedido=len(self.cliente_actual.historial_pedidos) if exito else None,
+                 latencia_ms=round(latencia, 3))
         
         if exito:
-            self.carrito = []
+            # El inventario se refresca solo con las filas que cambiaron
             self.actualizar_carrito()
-            self.actualizar_lista_inventario()
+            if self.construida("Producción"):
+                self.actualizar_lista_produccion()
+    
+    def pedido_produccion_seleccionado(self):
+        seleccion = self.produccion_listbox.curselection()
+        if not seleccion:
+            messagebox.showwarning("Advertencia", "Seleccione un pedido de la lista")
+            return None
+        return self.pedidos_produccion[seleccion[0]]
+    
+    def marcar_pedido_listo(self):
+        pedido = self.pedido_produccion_seleccionado()
+        if pedido:
+            try:
+                self.servicio.marcar_listo(pedido)
+                self.log(f"Pedido listo: {len(pedido.productos)} productos", "pedido_listo")
+                self.actualizar_lista_produccion()
+            except ValueError as error:
+                messagebox.showerror("Error", str(error))
+    
+    def entregar_pedido(self):
+        pedido = self.pedido_produccion_seleccionado()
+        if pedido:
+            try:
+                self.servicio.entregar_pedido(pedido)
+                self.log(f"Pedido entregado: {len(pedido.productos)} productos", "pedido_entregado")
+                self.actualizar_lista_produccion()
+            except ValueError as error:
+                messagebox.showerror("Error", str(error))
+    
+    def ver_metricas_produccion(self):
+        resumen = self.servicio.cola_produccion.resumen()
+        self.log(f"Producción: {resumen['pendientes']} en espera, {resumen['en_preparacion']} en preparación, "
+                 f"{resumen['entregados']} entregados ({resumen['pedidos_por_hora']:.1f} por hora), "
+                 f"espera promedio {resumen['espera_promedio']:.0f} s, máxima {resumen['espera_maxima']:.0f} s")
+    
+    def importar_archivo(self, tipo):
+        ruta = filedialog.askopenfilename(title=f"Importar {tipo}", filetypes=self.TIPOS_ARCHIVO)
+        if not ruta:
+            return
+        if self.importacion is not None:
+            messagebox.showwarning("Advertencia", "Ya hay una importación en curso")
+            return
+        # Un archivo grande tarda: se lee y valida en otro hilo, y aquí se aplica lote por lote, así la
+        # ventana sigue respondiendo y el servicio solo se modifica desde el hilo de Tk
+        self.log(f"Importando {tipo} desde {ruta}...")
+        lotes = queue.Queue(maxsize=2)
+        self.importacion = [tipo, self.importaciones.submit(self.leer_importacion, tipo, ruta, lotes), lotes, 0, 0, []]
+        self.root.after(50, self.aplicar_lotes_importacion)
+    
+    def leer_importacion(self, tipo, ruta, lotes):
+        for lote in self.servicio.validar_importacion(tipo, ruta):
+            # La cola es corta para no leer el archivo entero en memoria antes de aplicarlo
+            while not self.cancelar_importacion.is_set():
+                try:
+                    lotes.put(lote, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            if self.cancelar_importacion.is_set():
+                return
+    
+    def aplicar_lotes_importacion(self):
+        # importacion: [tipo, lectura, cola de lotes, filas importadas, cantidad de errores, primeros errores]
+        tipo, lectura, lotes, importadas, cantidad_errores, errores = self.importacion
+        terminada = lectura.done()
+        while True:
+            try:
+                lote, invalidas = lotes.get_nowait()
+            except queue.Empty:
+                break
+            fallidas = self.servicio.aplicar_importacion(tipo, lote)
+            importadas += len(lote) - len(fallidas)
+            cantidad_errores += len(invalidas) + len(fallidas)
+            errores.extend((invalidas + fallidas)[:100 - len(errores)])
+        self.importacion[3:5] = importadas, cantidad_errores
+        if not terminada:
+            self.root.after(50, self.aplicar_lotes_importacion)
+            return
+        self.importacion = None
+        try:
+            lectura.result()
+        except (OSError, UnicodeDecodeError, csv.Error) as error:
+            messagebox.showerror("Error", f"No se pudo leer el archivo: {error}")
+            return
+        errores.sort()
+        
+        # Las listas se refrescan una sola vez, al final; el inventario se actualiza con su observador
+        if tipo == "clientes":
+            self.actualizar_lista_clientes()
+        elif tipo == "productos":
+            self.actualizar_lista_productos()
+        elif tipo == "promociones":
+            self.actualizar_lista_promociones()
+        self.log(f"Importación de {tipo}: {importadas} filas importadas, {cantidad_errores} con errores",
+                 "importacion", tipo=tipo, filas=importadas, errores=cantidad_errores)
+        if errores:
+            detalle = "\n".join(f"Línea {linea}: {mensaje}" for linea, mensaje in errores[:10])
+            messagebox.showwarning("Advertencia", f"{cantidad_errores} filas no se importaron:\n{detalle}")
+    
+    def exportar_archivo(self, tipo):
+        ruta = filedialog.asksaveasfilename(title=f"Exportar {tipo}", filetypes=self.TIPOS_ARCHIVO,
+                                            defaultextension=".csv", initialfile=f"{tipo}.csv")
+        if not ruta:
+            return
+        try:
+            cantidad = self.servicio.exportar(tipo, ruta)
+        except OSError as error:
+            messagebox.showerror("Error", f"No se pudo escribir el archivo: {error}")
+            return
+        self.log(f"Exportación de {tipo}: {cantidad} filas en {ruta}", "exportacion", tipo=tipo, filas=cantidad)
     
     def aplicar_promocion(self):
         if not self.cliente_actual:
             messagebox.showwarning("Advertencia", "Seleccione un cliente primero")
             return
         
-        if not self.carrito:
+        if not self.carrito.productos:
             messagebox.showwarning("Advertencia", "El carrito está vacío")
             return
         
-        codigo = simpledialog.askstring("Promoción", "Ingrese el código de promoción:")
+        # Se propone la promoción del cliente que más descuenta
+        aplicables = self.servicio.promociones_aplicables(self.SESION, self.cliente_actual)
+        codigo = simpledialog.askstring("Promoción", "Ingrese el código de promoción:",
+                                        initialvalue=aplicables[0][0].codigo if aplicables else "")
         if codigo:
-            for promocion in self.promociones:
-                if promocion.codigo == codigo:
-                    total = sum(p.precio for p in self.carrito)
-                    total_con_descuento = promocion.aplicar_descuento(self.cliente_actual, total)
-                    
-                    if total_con_descuento < total:
-                        self.log(f"Promoción aplicada: {codigo}")
-                        self.log(f"Total original: ${total}")
-                        self.log(f"Total con descuento: ${total_con_descuento}")
-                        self.total_label.config(text=f"Total: ${total_con_descuento} (con {promocion.descuento}% de descuento)")
-                    else:
-                        self.log("El cliente no es elegible para esta promoción")
-                    return
-            
-            self.log(f"Código de promoción no válido: {codigo}")
+            resultado, promocion, total, total_con_descuento = self.servicio.aplicar_promocion(
+                self.SESION, self.cliente_actual, codigo)
+            if resultado == ResultadoPromocion.INVALIDA:
+                self.log(f"Código de promoción no válido: {codigo}")
+            elif resultado == ResultadoPromocion.YA_APLICADA:
+                self.log(f"La promoción {codigo} ya está aplicada en el carrito")
+            elif resultado == ResultadoPromocion.NO_ELEGIBLE:
+                self.log("El cliente no es elegible para esta promoción")
+            else:
+                self.log(f"Promoción aplicada: {codigo}", "promocion", cliente=self.cliente_actual.id, codigo=codigo)
+                self.log(f"Total anterior: {formatear_dinero(total)}")
+                self.log(f"Total con descuento: {formatear_dinero(total_con_descuento)}")
+                self.actualizar_total_carrito()
     
     def actualizar_inventario(self):
         ingrediente = self.ingrediente_entry.get()
@@ -476,14 +4047,29 @@ class CoffeeShopGUI:
         
         try:
             cantidad = int(cantidad)
-            mensaje = self.inventario.actualizar_stock(ingrediente, cantidad)
-            self.log(mensaje)
-            self.actualizar_lista_inventario()
+            mensaje = self.servicio.actualizar_stock(ingrediente, cantidad)
+            self.log(mensaje, "stock", ingrediente=ingrediente, cantidad=cantidad)
             self.ingrediente_entry.delete(0, tk.END)
             self.cantidad_entry.delete(0, tk.END)
         except ValueError:
             messagebox.showerror("Error", "La cantidad debe ser un número entero")
     
+    def ver_sugerencias_reorden(self):
+        sugerencias = self.servicio.pronostico.sugerencias_reorden()
+        if not sugerencias:
+            self.log("No hay ingredientes que requieran reorden")
+            return
+        lineas = ["\nSugerencias de reorden:"]
+        for ingrediente, stock, horas, cantidad in sugerencias:
+            agotamiento = f"se agota en ~{horas} h" if horas is not None else "sin agotamiento previsto"
+            lineas.append(f"  - {ingrediente}: {formatear_cantidad(stock)} en stock, {agotamiento}, pedir {cantidad}")
+        self.log("\n".join(lineas))
+    
+    def alerta_stock_bajo(self, ingrediente, stock, punto_reorden):
+        self.log(f"Stock bajo: {ingrediente} - {formatear_cantidad(stock)} unidades "
+                 f"(punto de reorden: {formatear_cantidad(punto_reorden)})",
+                 "stock_bajo", ingrediente=ingrediente, stock=stock)
+    
     def agregar_empleado(self):
         nombre = self.empleado_nombre_entry.get()
         rol_str = self.empleado_rol_combobox.get()
@@ -499,9 +4085,7 @@ class CoffeeShopGUI:
                 break
         
         if rol:
-            nuevo_empleado = Empleado(nombre, rol)
-            self.empleados.append(nuevo_empleado)
-            self.actualizar_lista_empleados()
+            self.servicio.agregar_empleado(nombre, rol)
             self.log(f"Empleado agregado: {nombre} como {rol.value}")
             self.empleado_nombre_entry.delete(0, tk.END)
         else:
@@ -520,16 +4104,276 @@ class CoffeeShopGUI:
             if descuento <= 0 or descuento > 100:
                 raise ValueError
             
-            nueva_promocion = Promocion(codigo, descuento, [])
-            self.promociones.append(nueva_promocion)
-            self.actualizar_lista_promociones()
+            if self.servicio.agregar_promocion(codigo, descuento) is None:
+                messagebox.showerror("Error", f"Ya existe una promoción con el código {codigo}")
+                return
             self.log(f"Promoción agregada: {codigo} con {descuento}% de descuento")
             self.promo_codigo_entry.delete(0, tk.END)
             self.promo_descuento_entry.delete(0, tk.END)
         except ValueError:
             messagebox.showerror("Error", "El descuento debe ser un número entre 1 y 100")
 
-if __name__ == "__main__":
+def medir_listas(filas=(10_000, 100_000), repeticiones=3):
+    # Refresco completo de las listas de productos, promociones y clientes con muchas filas, sobre una
+    # ventana real de Tk que no se muestra (la de productos muestra solo lo que devuelve la búsqueda, con
+    # su límite). Se toma la mejor de varias repeticiones, en milisegundos
+    resultados = []
+    for cantidad in filas:
+        servicio = CafeteriaService()
+        servicio.clientes = [Cliente(f"Cliente {i + 1}", id=i + 1) for i in range(cantidad)]
+        servicio.clientes_por_id = {cliente.id: cliente for cliente in servicio.clientes}
+        servicio.productos = [Bebida(f"Café {i}", 30 + i % 50, "Mediano", "Caliente", []) if i % 2 else
+                              Postre(f"Galleta {i}", 20 + i % 30, i % 3 == 0, i % 5 == 0) for i in range(cantidad)]
+        servicio.indice_catalogo = IndiceCatalogo(servicio.productos)
+        servicio.promociones = [Promocion(f"PROMO{i}", 5 + i % 45, servicio.clientes[i:i + 2]) for i in range(cantidad)]
+        servicio.indice_promociones = IndicePromociones(servicio.promociones)
+        
+        root = tk.Tk()
+        root.withdraw()
+        interfaz = CoffeeShopGUI(root, servicio)
+        for tab, _, _ in list(interfaz.pestañas_pendientes.values()):
+            interfaz.notebook.select(tab)
+            interfaz.construir_pestaña()
+        fila = {"filas": cantidad}
+        for nombre in ("productos", "promociones", "clientes"):
+            actualizar = getattr(interfaz, f"actualizar_lista_{nombre}")
+            mejor = None
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                actualizar()
+                root.update_idletasks()
+                segundos = time.perf_counter() - inicio
+                mejor = segundos if mejor is None else min(mejor, segundos)
+            fila[f"{nombre}_ms"] = mejor * 1000
+        interfaz.cerrar()
+        resultados.append(fila)
+    return resultados
+
+def medir_registro(eventos=100_000, carpeta=None):
+    # El mismo volumen de eventos por RegistroArchivo solo y por log() de la interfaz, sobre una ventana de
+    # Tk que no se muestra. "llamada" es lo que espera quien registra; "total" incluye vaciar la consola y
+    # esperar a que el hilo escritor deje todo en el archivo
+    carpeta = carpeta or tempfile.mkdtemp()
+    resultados = {"eventos": eventos}
+    
+    registro = RegistroArchivo(os.path.join(carpeta, "registro.jsonl"))
+    inicio = time.perf_counter()
+    for i in range(eventos):
+        registro.escribir("medicion", mensaje=f"Evento {i}", numero=i)
+    llamadas = time.perf_counter() - inicio
+    registro.cerrar()
+    total = time.perf_counter() - inicio
+    resultados["archivo"] = {"llamada_us": llamadas / eventos * 1e6, "eventos_por_segundo": eventos / total}
+    
     root = tk.Tk()
-    app = CoffeeShopGUI(root)
-    root.mainloop()
\ No newline at end of file
+    root.withdraw()
+    interfaz = CoffeeShopGUI(root, CafeteriaService(), registro=RegistroArchivo(os.path.join(carpeta, "interfaz.jsonl")))
+    inicio = time.perf_counter()
+    for i in range(eventos):
+        interfaz.log(f"Evento {i}", "medicion", numero=i)
+    llamadas = time.perf_counter() - inicio
+    if interfaz.consola_programada:
+        interfaz.vaciar_consola()
+    root.update_idletasks()
+    interfaz.cerrar()
+    total = time.perf_counter() - inicio
+    resultados["interfaz"] = {"llamada_us": llamadas / eventos * 1e6, "eventos_por_segundo": eventos / total}
+    return resultados
+
+if __name__ == "__main__":
+    # En el .exe congelado, los procesos de las tiendas vuelven a ejecutar este archivo: esto los
+    # desvía a su función en lugar de abrir otra ventana
+    multiprocessing.freeze_support()
+    carpeta = os.path.dirname(os.path.abspath(sys.argv[0]))
+    
+    # CAFETERIA_METRICAS=1 activa la medición; CAFETERIA_PERFIL=1 además perfila con cProfile
+    metricas.activo = os.environ.get("CAFETERIA_METRICAS") == "1"
+    if os.environ.get("CAFETERIA_PERFIL") == "1":
+        metricas.iniciar_perfil()
+    
+    def crear_servicio():
+        return CafeteriaService(RepositorioInstantanea(os.path.join(carpeta, "cafeteria.snap"),
+                                                       RepositorioSQLite(os.path.join(carpeta, "cafeteria.db"))))
+    
+    # Las mediciones trabajan con datos propios en memoria: solo la red de tiendas, el servidor y la
+    # interfaz abren la base real. La interfaz la carga en segundo plano
+    if "--tiendas" in sys.argv:
+        # Prueba local de la red: python Interfaz_Cafeteria_Julian.py --tiendas N [pedidos]
+        servicio = crear_servicio()
+        argumentos = sys.argv[sys.argv.index("--tiendas") + 1:]
+        maximo = int(argumentos[0]) if argumentos else 4
+        for cantidad in range(1, maximo + 1):
+            resultado = medir_red_tiendas(cantidad, int(argumentos[1]) if len(argumentos) > 1 else 2000,
+                                          servicio.productos)
+            print(f"{cantidad} tiendas: {resultado['pedidos_por_segundo']:.0f} pedidos/s, "
+                  f"p50 {resultado['latencia_p50'] * 1000:.2f} ms, p99 {resultado['latencia_p99'] * 1000:.2f} ms, "
+                  f"atendidos {resultado['por_tienda']}")
+        servicio.cerrar()
+    elif "--lotes" in sys.argv:
+        # python Interfaz_Cafeteria_Julian.py --lotes [pedidos] [tamaño del lote]
+        argumentos = sys.argv[sys.argv.index("--lotes") + 1:]
+        resultado = medir_lotes(int(argumentos[0]) if argumentos else 20000,
+                                int(argumentos[1]) if len(argumentos) > 1 else 200)
+        print(f"{resultado['pedidos']} pedidos: {resultado['uno_por_uno_pedidos_por_segundo']:.0f} pedidos/s "
+              f"uno por uno, {resultado['en_lotes_pedidos_por_segundo']:.0f} en lotes de {resultado['tamaño_lote']}"
+              + ("" if resultado["mismo_inventario"] else " (¡el inventario final no coincide!)"))
+    elif "--escritura" in sys.argv:
+        # python Interfaz_Cafeteria_Julian.py --escritura [pedidos]; usa una base temporal, no la real
+        argumentos = sys.argv[sys.argv.index("--escritura") + 1:]
+        resultados = medir_escritura(int(argumentos[0]) if argumentos else 5000)
+        for nombre in ("directa", "diferida"):
+            resultado = resultados[nombre]
+            print(f"Escritura {nombre}: {resultado['pedidos_por_segundo']:.0f} pedidos/s en "
+                  f"{resultado['transacciones']} transacciones ({resultado['transacciones_por_segundo']:.0f}/s), "
+                  f"guardar_pedido p50 {resultado['latencia_p50_ms']:.3f} ms, p99 {resultado['latencia_p99_ms']:.3f} ms")
+    elif "--instantanea" in sys.argv:
+        # python Interfaz_Cafeteria_Julian.py --instantanea [clientes] [pedidos]; usa una carpeta temporal
+        argumentos = sys.argv[sys.argv.index("--instantanea") + 1:]
+        resultados = medir_instantanea(int(argumentos[0]) if argumentos else 100_000,
+                                       int(argumentos[1]) if len(argumentos) > 1 else 1_000_000)
+        print(f"{resultados['clientes']} clientes, {resultados['pedidos']} pedidos:")
+        for nombre in ("instantanea", "pickle", "json"):
+            resultado = resultados[nombre]
+            print(f"  {nombre}: arranque {resultado['cargar_s'] * 1000:.0f} ms, guardado "
+                  f"{resultado['guardar_s'] * 1000:.0f} ms, {resultado['bytes'] / 2 ** 20:.1f} MB")
+    elif "--concurrencia" in sys.argv:
+        # Cajas simultáneas sobre el mismo inventario: python Interfaz_Cafeteria_Julian.py --concurrencia [hilos]
+        argumentos = sys.argv[sys.argv.index("--concurrencia") + 1:]
+        resultado = medir_concurrencia(int(argumentos[0]) if argumentos else 16)
+        print(f"Última unidad: {resultado['hilos']} cajas por {resultado['unidades']} unidades, "
+              f"{resultado['rondas']} rondas, {resultado['rondas_incorrectas']} con ventas de más o de menos")
+        for fila in resultado["escalado"]:
+            print(f"{fila['hilos']} hilos: {fila['por_ingrediente']:.0f} ventas/s con candado por ingrediente, "
+                  f"{fila['candado_global']:.0f} con un candado global")
+        print("Stock final consistente" if resultado["stock_consistente"] else "Stock final INCONSISTENTE")
+    elif "--demanda" in sys.argv:
+        # python Interfaz_Cafeteria_Julian.py --demanda [productos por pedido...]
+        argumentos = sys.argv[sys.argv.index("--demanda") + 1:]
+        tamaños = [int(argumento) for argumento in argumentos if argumento.isdigit()]
+        for fila in medir_demanda(tamaños or (10, 100, 10_000)):
+            print(f"Pedido de {fila['productos']} productos: {fila['por_llamada_us']:.1f} µs armando el diccionario "
+                  f"en cada llamada, {fila['precalculada_us']:.1f} µs con la demanda precalculada"
+                  + ("" if fila["mismo_resultado"] else " (¡los resultados no coinciden!)"))
+    elif "--memoria" in sys.argv:
+        # python Interfaz_Cafeteria_Julian.py --memoria [pedidos]
+        argumentos = sys.argv[sys.argv.index("--memoria") + 1:]
+        resultados = medir_memoria(int(argumentos[0]) if argumentos else 1_000_000)
+        for nombre in ("con_diccionario", "con_slots"):
+            resultado = resultados[nombre]
+            print(f"{resultados['pedidos']} pedidos {nombre.replace('_', ' ')}: "
+                  f"{resultado['bytes_por_pedido']:.0f} bytes por pedido, {resultado['total_mb']:.1f} MB")
+    elif "--estadisticas" in sys.argv:
+        # python Interfaz_Cafeteria_Julian.py --estadisticas [pedidos] [clientes]
+        argumentos = sys.argv[sys.argv.index("--estadisticas") + 1:]
+        resultado = medir_estadisticas(int(argumentos[0]) if argumentos else 1_000_000,
+                                       int(argumentos[1]) if len(argumentos) > 1 else 100_000)
+        print(f"{resultado['pedidos']} pedidos de {resultado['clientes']} clientes: registrar "
+              f"{resultado['registrar_us']:.2f} µs por pedido; mejores clientes y más vendidos "
+              f"{resultado['consulta_ranking_us']:.1f} µs con el ranking, "
+              f"{resultado['consulta_recorriendo_todo_us']:.1f} µs recorriendo todas las claves"
+              + ("" if resultado["mismo_resultado"] else " (¡los resultados no coinciden!)"))
+    elif "--promociones" in sys.argv:
+        # python Interfaz_Cafeteria_Julian.py --promociones [códigos] [clientes]
+        argumentos = sys.argv[sys.argv.index("--promociones") + 1:]
+        resultados = medir_promociones(int(argumentos[0]) if argumentos else 5000,
+                                       int(argumentos[1]) if len(argumentos) > 1 else 50_000)
+        print(f"{resultados['codigos']} códigos, {resultados['clientes']} clientes, {resultados['consultas']} consultas"
+              + ("" if resultados["mismo_resultado"] else " (¡los resultados no coinciden!)"))
+        for nombre in ("lineal", "indice"):
+            resultado = resultados[nombre]
+            print(f"  {nombre}: buscar {resultado['buscar_us']:.2f} µs, elegibilidad {resultado['elegibilidad_us']:.2f} µs, "
+                  f"promociones del cliente {resultado['aplicables_us']:.2f} µs")
+    elif "--listas" in sys.argv:
+        # Necesita pantalla, aunque la ventana no se muestra: python Interfaz_Cafeteria_Julian.py --listas [filas...]
+        argumentos = sys.argv[sys.argv.index("--listas") + 1:]
+        cantidades = [int(argumento) for argumento in argumentos if argumento.isdigit()]
+        for fila in medir_listas(cantidades or (10_000, 100_000)):
+            print(f"{fila['filas']} filas: productos {fila['productos_ms']:.0f} ms, "
+                  f"promociones {fila['promociones_ms']:.0f} ms, clientes {fila['clientes_ms']:.0f} ms")
+    elif "--registro" in sys.argv:
+        # Necesita pantalla, aunque la ventana no se muestra: python Interfaz_Cafeteria_Julian.py --registro [eventos]
+        argumentos = sys.argv[sys.argv.index("--registro") + 1:]
+        resultados = medir_registro(int(argumentos[0]) if argumentos else 100_000)
+        for nombre in ("archivo", "interfaz"):
+            resultado = resultados[nombre]
+            print(f"{resultados['eventos']} eventos por {nombre}: {resultado['llamada_us']:.2f} µs por llamada, "
+                  f"{resultado['eventos_por_segundo']:.0f} eventos/s hasta quedar en el archivo")
+    elif "--pronostico" in sys.argv:
+        # python Interfaz_Cafeteria_Julian.py --pronostico [días] [pedidos por hora]
+        argumentos = sys.argv[sys.argv.index("--pronostico") + 1:]
+        resultado = medir_pronostico(int(argumentos[0]) if argumentos else 30,
+                                     int(argumentos[1]) if len(argumentos) > 1 else 60)
+        print(f"{resultado['dias']} días, {resultado['eventos']} consumos de {resultado['ingredientes']} ingredientes: "
+              f"{resultado['microsegundos_por_evento']:.2f} µs por evento")
+    elif "--catalogo" in sys.argv:
+        # python Interfaz_Cafeteria_Julian.py --catalogo [productos]
+        argumentos = sys.argv[sys.argv.index("--catalogo") + 1:]
+        resultados = medir_catalogo(int(argumentos[0]) if argumentos else 100_000)
+        print(f"{resultados['productos']} productos, índice armado en {resultados['construccion_ms']:.0f} ms")
+        for nombre in ("prefijo", "sin_acentos", "filtrada"):
+            resultado = resultados[nombre]
+            print(f"  {nombre}: p50 {resultado['p50_us']:.0f} µs, p99 {resultado['p99_us']:.0f} µs, "
+                  f"promedio {resultado['promedio_us']:.0f} µs ({resultado['resultados_promedio']:.0f} resultados)")
+    elif "--turno" in sys.argv:
+        # Cuántos baristas hacen falta para una demanda: python Interfaz_Cafeteria_Julian.py --turno [pedidos por hora] [baristas]
+        argumentos = sys.argv[sys.argv.index("--turno") + 1:]
+        pedidos_por_hora = int(argumentos[0]) if argumentos else 60
+        productos = CafeteriaService().productos
+        for baristas in range(1, (int(argumentos[1]) if len(argumentos) > 1 else 4) + 1):
+            resumen = simular_turno(baristas, pedidos_por_hora, productos=productos)
+            print(f"{baristas} baristas, {pedidos_por_hora} pedidos/h: {resumen['pedidos_por_hora']:.1f} entregados "
+                  f"por hora, espera promedio {resumen['espera_promedio']:.0f} s, máxima {resumen['espera_maxima']:.0f} s, "
+                  f"{resumen['pendientes'] + resumen['en_preparacion']} sin terminar al cierre")
+    elif "--precios" in sys.argv:
+        resultado = medir_precios()
+        print(f"Carrito de {resultado['lineas']} líneas: {resultado['microsegundos_por_cambio']:.1f} µs por cambio "
+              f"(sumando todo: {resultado['microsegundos_sumando_todo']:.1f} µs)")
+    elif "--importacion" in sys.argv:
+        argumentos = sys.argv[sys.argv.index("--importacion") + 1:]
+        resultados = medir_importacion(int(argumentos[0]) if argumentos else 1_000_000)
+        for nombre, resultado in resultados.items():
+            if nombre != "filas":
+                print(f"{nombre}: exporta {resultado['escritura_filas_por_segundo']:.0f} filas/s, "
+                      f"importa {resultado['importacion_filas_por_segundo']:.0f} filas/s"
+                      + (f", pico {resultado['pico_memoria_mb']:.1f} MB" if "pico_memoria_mb" in resultado else ""))
+    elif "--carga" in sys.argv:
+        # La primera corrida queda como base; las siguientes se comparan con ella. --nueva-base la reemplaza
+        argumentos = [argumento for argumento in sys.argv[sys.argv.index("--carga") + 1:] if argumento.isdigit()]
+        resultado = medir_pedidos(int(argumentos[0]) if argumentos else 20000)
+        print(f"{resultado['pedidos_por_segundo']:.0f} pedidos/s, pico de memoria "
+              f"{resultado['pico_memoria_mb']:.1f} MB, {resultado['resultados']}")
+        for operacion, latencia in resultado["latencias_ms"].items():
+            print(f"  {operacion}: p50 {latencia['p50']:.3f} ms, p90 {latencia['p90']:.3f} ms, "
+                  f"p99 {latencia['p99']:.3f} ms ({latencia['cantidad']} llamadas)")
+        ruta_base = os.path.join(carpeta, "cafeteria.base.json")
+        if os.path.exists(ruta_base) and "--nueva-base" not in sys.argv:
+            with open(ruta_base, encoding="utf-8") as archivo:
+                regresiones = comparar_con_base(resultado, json.load(archivo))
+            print("\n".join(regresiones) if regresiones else "Sin regresiones respecto de la base")
+        else:
+            with open(ruta_base, "w", encoding="utf-8") as archivo:
+                json.dump(resultado, archivo, indent=2)
+            print(f"Base guardada en {ruta_base}")
+    elif "--servidor-carga" in sys.argv:
+        # Conexiones simultáneas contra un servidor en memoria: python Interfaz_Cafeteria_Julian.py --servidor-carga N [pedidos]
+        argumentos = sys.argv[sys.argv.index("--servidor-carga") + 1:]
+        resultado = medir_servidor(int(argumentos[0]) if argumentos else 100,
+                                   int(argumentos[1]) if len(argumentos) > 1 else 20)
+        print(f"{resultado['conexiones']} conexiones: {resultado['solicitudes_por_segundo']:.0f} solicitudes/s, "
+              f"{resultado['fallidas']} de {resultado['solicitudes']} rechazadas")
+        for accion, latencia in resultado["latencias_ms"].items():
+            print(f"  {accion}: p50 {latencia['p50']:.3f} ms, p99 {latencia['p99']:.3f} ms, "
+                  f"máxima {latencia['maximo']:.3f} ms")
+    elif "--servidor" in sys.argv:
+        # Modo sin pantalla: python Interfaz_Cafeteria_Julian.py --servidor [puerto]
+        argumentos = sys.argv[sys.argv.index("--servidor") + 1:]
+        ejecutar_servidor(crear_servicio(), puerto=int(argumentos[0]) if argumentos else 8765)
+    else:
+        root = tk.Tk()
+        app = CoffeeShopGUI(root, registro=RegistroArchivo(os.path.join(carpeta, "cafeteria.log.jsonl")),
+                            crear_servicio=crear_servicio)
+        root.mainloop()
+    
+    metricas.detener_perfil(os.path.join(carpeta, "cafeteria.prof"))
+    if metricas.activo:
+        metricas.guardar_prometheus(os.path.join(carpeta, "cafeteria.prom"))
\ No newline at end of file